@@ -1,5 +1,5 @@
 import ctypes
-from typing import Callable, List, Tuple
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple, Union
 
 # Global variables
 VID_POINTERS: int = 5
@@ -54,27 +54,193 @@ METHOD_SIGNATURES: dict = {
     "SetVideoDeviceIndex": ([ctypes.c_int], None),
     "SetVideoProcAmp": ([ctypes.c_long], None),
     "SetEventCallback": ([ctypes.CFUNCTYPE(None)], None),
+    "GetWiFiImage": ([ctypes.c_char_p], ctypes.c_bool),
+    "SetWiFiVideoRes": ([ctypes.c_int, ctypes.c_int], ctypes.c_bool),
 }
 
 
+class _LazyLibrary:
+    """
+    Resolve DNX64.dll exports on first use.
+
+    The signature from METHOD_SIGNATURES is applied when a function is first
+    looked up, and the bound function is then cached as an attribute so
+    later calls skip this class entirely. A missing export only fails the
+    call that needs it, not the construction of `DNX64`.
+    """
+
+    def __init__(self, library: ctypes.CDLL) -> None:
+        self._library = library
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            function = getattr(self._library, name)
+        except AttributeError:
+            raise AttributeError(f"{self._library._name} does not export {name}") from None
+        if name in METHOD_SIGNATURES:
+            argtypes, restype = METHOD_SIGNATURES[name]
+            function.argtypes = argtypes
+            function.restype = restype
+        setattr(self, name, function)
+        return function
+
+    def exports(self, name: str) -> bool:
+        try:
+            getattr(self._library, name)
+        except AttributeError:
+            return False
+        return True
+
+
 class DNX64:
     def __init__(self, dll_path: str) -> None:
         """
         Initialize the DNX64 class.
 
         Parameters:
-            dll_path (str): Path to the DNX64.dll library file.
+            dll_path (str): Path to the DNX64.dll library file, or
+                "simulator[?options]" for the pure-Python simulator
+                (see `DNX64.simulator.SimulatedLibrary.from_path`).
         """
-        self.dnx64 = ctypes.CDLL(dll_path)
-        self.setup()
+        if dll_path.startswith("simulator"):
+            from .simulator import SimulatedLibrary
+
+            self.dnx64 = SimulatedLibrary.from_path(dll_path)
+        else:
+            self.dnx64 = _LazyLibrary(ctypes.CDLL(dll_path))
+        # Features decoded from GetConfig, per device index.
+        self._features: Dict[int, "DeviceFeatures"] = {}
+        # Devices whose GetConfig failed; feature checks are skipped for them until Init.
+        self._config_unreadable: Set[int] = set()
+        # Last values written by apply_settings or the setters it uses, per device index.
+        self._settings_state: Dict[int, Dict[Any, Any]] = {}
 
     def setup(self) -> None:
         """
-        Set up the signatures for DNX64.dll methods using dictionary constant.
+        Set up the signatures for all DNX64.dll methods now instead of on first use.
+        Methods the library does not export are skipped.
+        """
+        for method_name in METHOD_SIGNATURES:
+            if self.dnx64.exports(method_name):
+                getattr(self.dnx64, method_name)
+
+    def capabilities(self) -> Dict[str, bool]:
+        """
+        Report which DNX64 functions the loaded library exports.
+
+        Returns:
+            Dict[str, bool]: Method name to True if exported, for every entry of METHOD_SIGNATURES.
+        """
+        return {name: self.dnx64.exports(name) for name in METHOD_SIGNATURES}
+
+    def features(self, device_index: int) -> "DeviceFeatures":
+        """
+        Get the features of a device, decoded once from `GetConfig`.
+
+        Parameters:
+            device_index (int): Index of the device.
+
+        Returns:
+            DeviceFeatures: EDOF, AMR, eFLC, APL, LED segments, FLC and AXI support.
+        """
+        features = self._features.get(device_index)
+        if features is None:
+            features = self._features[device_index] = DeviceFeatures.from_config(self.GetConfig(device_index))
+        return features
+
+    def _require(self, method: str, device_index: int) -> None:
+        if device_index in self._config_unreadable:
+            return
+        try:
+            features = self.features(device_index)
+        except Exception:
+            # Configuration unreadable: leave it to the DLL, and do not ask
+            # again before the next Init.
+            self._config_unreadable.add(device_index)
+            return
+        if not features.supports(method):
+            raise UnsupportedFeatureError(
+                f"{method} requires {REQUIRED_FEATURE[method]}, which device {device_index} "
+                f"(config 0x{features.config:X}) does not have"
+            )
+
+    def apply_settings(
+        self, device_index: int, profile: Union["DeviceSettings", Mapping[str, Any]], settle: Optional[float] = None
+    ) -> List[Tuple[str, tuple]]:
+        """
+        Bring a device to a settings profile with as few calls as possible.
+
+        Values already written by an earlier `apply_settings` on this instance
+        or a direct setter call on this instance are skipped, the remaining
+        writes are made back to back in an order where each takes effect, and
+        the command time is waited once at the end. Call `forget_settings`
+        after changing the device by other means.
+
+        Parameters:
+            device_index (int): Index of the device.
+            profile: `DeviceSettings`, or a dict of its fields (e.g. one entry of `load_profiles`).
+            settle (Optional[float]): Seconds to wait after the last write; defaults to the
+                scheduler's COMMAND_TIME.
+
+        Returns:
+            List[Tuple[str, tuple]]: The DNX64 calls made, in order.
+        """
+        return self._apply_settings(self, device_index, profile, settle)
+
+    def _apply_settings(self, target, device_index: int, profile, settle: Optional[float]) -> List[Tuple[str, tuple]]:
+        # Write through `target` (this instance or a proxy such as CachedDNX64)
+        # while diffing against the one state this instance keeps.
+        known = self._settings_state.setdefault(device_index, {})
+        if settle is None:
+            return apply_settings(target, device_index, profile, known)
+        return apply_settings(target, device_index, profile, known, settle)
+
+    def _remember_setting(self, setter: str, device_index: int, value: Any) -> None:
+        # Keep apply_settings' view current when setters are called directly.
+        known = self._settings_state.get(device_index)
+        if known is not None:
+            known[SETTING_FOR_SETTER[setter]] = value
+            if setter == "SetAutoExposure" and value:
+                known.pop("exposure", None)
+
+    def forget_settings(self, device_index: Optional[int] = None) -> None:
+        """Forget the values `apply_settings` wrote, for one device or all of them."""
+        if device_index is None:
+            self._settings_state.clear()
+        else:
+            self._settings_state.pop(device_index, None)
+
+    def enable_tracing(self, path: Optional[str] = None, keep: int = 1000) -> "CallTracer":
         """
-        for method_name, (argtypes, restype) in METHOD_SIGNATURES.items():
-            getattr(self.dnx64, method_name).argtypes = argtypes
-            getattr(self.dnx64, method_name).restype = restype
+        Record every DNX64 method call on this instance.
+
+        Each method is shadowed by a traced wrapper on the instance, so an
+        untraced DNX64 pays nothing. Calls made while tracing record their
+        arguments, result, thread and wall/CPU time; see `CallTracer`.
+
+        Parameters:
+            path (Optional[str]): Also append each call to this JSON-lines file.
+            keep (int): Number of recent calls kept in memory.
+
+        Returns:
+            CallTracer: The tracer; `stats()` gives per-method latency histograms.
+        """
+        self.disable_tracing()
+        self.tracer = CallTracer(path, keep)
+        for name in METHOD_SIGNATURES:
+            setattr(self, name, self.tracer.wrap(name, getattr(self, name)))
+        return self.tracer
+
+    def disable_tracing(self) -> None:
+        """Remove the traced wrappers installed by `enable_tracing` and close the trace file."""
+        tracer = self.__dict__.pop("tracer", None)
+        if tracer is None:
+            return
+        for name in METHOD_SIGNATURES:
+            self.__dict__.pop(name, None)
+        tracer.close()
 
     def Init(self) -> bool:
         """
@@ -83,6 +249,9 @@ class DNX64:
         Returns:
             bool: True if successful, False otherwise.
         """
+        self._features.clear()
+        self._config_unreadable.clear()
+        self._settings_state.clear()
         try:
             return self.dnx64.Init()
         except OSError as e:
@@ -135,6 +304,7 @@ class DNX64:
         Returns:
             float: Automatic Magnification Reading (AMR).
         """
+        self._require("GetAMR", device_index)
         return self.dnx64.GetAMR(device_index)
 
     def GetAutoExposure(self, device_index: int) -> int:
@@ -223,6 +393,7 @@ class DNX64:
         Returns:
             Tuple[int, int]: Upper and lower lens fine position limits.
         """
+        self._require("GetLensFinePosLimits", device_index)
         upper_limit, lower_limit = ctypes.c_long(), ctypes.c_long()
         self.dnx64.GetLensFinePosLimits(device_index, upper_limit, lower_limit)
         return upper_limit.value, lower_limit.value
@@ -239,18 +410,25 @@ class DNX64:
         Returns:
             Tuple[int, int]: Upper and lower lens position limits.
         """
+        self._require("GetLensPosLimits", device_index)
         upper_limit, lower_limit = ctypes.c_long(), ctypes.c_long()
         self.dnx64.GetLensPosLimits(device_index, upper_limit, lower_limit)
         return upper_limit.value, lower_limit.value
 
-    def GetVideoDeviceCount(self) -> int:
+    def GetVideoDeviceCount(self, init: bool = True) -> int:
         """
         Get total number of video devices being detected
 
+        Parameters:
+            init (bool): Re-initialize the control object first so newly
+                connected devices are counted. Pass False when `Init()` has
+                just been called, e.g. from `DeviceRegistry`.
+
         Returns:
             int: Total number of video devices.
         """
-        self.dnx64.Init()
+        if init:
+            self.dnx64.Init()
         return self.dnx64.GetVideoDeviceCount()
 
     def GetVideoDeviceIndex(self) -> int:
@@ -317,11 +495,8 @@ class DNX64:
         Returns:
             bool: True if successful.
         """
-        # Convert Python string to ctypes byte array
-        filename_bytes = filename.encode("utf-8")
-        filename_array = (ctypes.c_byte * len(filename_bytes))(*filename_bytes)
-
-        return self.dnx64.GetWiFiImage(filename_array)
+        # Null-terminated byte string, as declared in METHOD_SIGNATURES
+        return self.dnx64.GetWiFiImage(filename.encode("utf-8"))
 
     def GetWiFiVideoCaps(self) -> Tuple[int, List[Tuple[int, int]]]:
         """
@@ -359,6 +534,7 @@ class DNX64:
             ae_target (int): AE target value. Acceptable Range: 16 to 20
         """
         self.dnx64.SetAETarget(device_index, ae_target)
+        self._remember_setting("SetAETarget", device_index, ae_target)
 
     def SetAutoExposure(self, device_index: int, ae_state: int) -> None:
         """
@@ -369,6 +545,7 @@ class DNX64:
             ae_state (int): Auto exposure value. Accepts 0 and 1.
         """
         self.dnx64.SetAutoExposure(device_index, ae_state)
+        self._remember_setting("SetAutoExposure", device_index, ae_state)
 
     def SetAimpointLevel(self, device_index: int, apl_level: int) -> None:
         """
@@ -380,7 +557,9 @@ class DNX64:
             device_index (int): Index of the device.
             apl_level (int): Aim point laser level. Accepts 0 to 6.
         """
+        self._require("SetAimpointLevel", device_index)
         self.dnx64.SetAimpointLevel(device_index, apl_level)
+        self._remember_setting("SetAimpointLevel", device_index, apl_level)
 
     def SetAXILevel(self, device_index: int, axi_level: int) -> None:
         """
@@ -392,7 +571,9 @@ class DNX64:
             device_index (int): Index of the device.
             axi_level (int): AXI level. Accepts 0 to 6.
         """
+        self._require("SetAXILevel", device_index)
         self.dnx64.SetAXILevel(device_index, axi_level)
+        self._remember_setting("SetAXILevel", device_index, axi_level)
 
     def SetEventCallback(self, external_callback: Callable) -> None:
         """
@@ -415,6 +596,7 @@ class DNX64:
             exposure_value (int): Exposure value.
         """
         self.dnx64.SetExposureValue(device_index, exposure_value)
+        self._remember_setting("SetExposureValue", device_index, exposure_value)
 
     def SetFLCSwitch(self, device_index: int, flc_quadrant: int) -> None:
         """
@@ -427,7 +609,9 @@ class DNX64:
             device_index (int): Index of the device.
             flc_quadrant (int): FLC quadrant.
         """
+        self._require("SetFLCSwitch", device_index)
         self.dnx64.SetFLCSwitch(device_index, flc_quadrant)
+        self._remember_setting("SetFLCSwitch", device_index, flc_quadrant)
 
     def SetFLCLevel(self, device_index: int, flc_level: int) -> None:
         """
@@ -438,6 +622,7 @@ class DNX64:
             flc_level (int): FLC level. Accepts 1 to 6
         """
         self.dnx64.SetFLCLevel(device_index, flc_level)
+        self._remember_setting("SetFLCLevel", device_index, flc_level)
 
     def SetLEDState(self, device_index: int, led_state: int) -> None:
         """
@@ -452,6 +637,7 @@ class DNX64:
             led_state (int): LED state.
         """
         self.dnx64.SetLEDState(device_index, led_state)
+        self._remember_setting("SetLEDState", device_index, led_state)
 
     def SetLensInitPos(self, device_index: int) -> None:
         """
@@ -462,7 +648,10 @@ class DNX64:
         Parameters:
             device_index (int): Index of the device.
         """
+        self._require("SetLensInitPos", device_index)
         self.dnx64.SetLensInitPos(device_index)
+        for key in ("lens_position", "lens_fine_position"):
+            self._settings_state.get(device_index, {}).pop(key, None)
 
     def SetLensFinePos(self, device_index: int, lens_fine_position: int) -> None:
         """
@@ -474,7 +663,9 @@ class DNX64:
             device_index (int): Index of the device.
             lens_fine_position (int): Lens fine position.
         """
+        self._require("SetLensFinePos", device_index)
         self.dnx64.SetLensFinePos(device_index, lens_fine_position)
+        self._remember_setting("SetLensFinePos", device_index, lens_fine_position)
 
     def SetLensPos(self, device_index: int, lens_position: int) -> None:
         """
@@ -486,7 +677,9 @@ class DNX64:
             device_index (int): Index of the device.
             lens_position (int): Lens position.
         """
+        self._require("SetLensPos", device_index)
         self.dnx64.SetLensPos(device_index, lens_position)
+        self._remember_setting("SetLensPos", device_index, lens_position)
 
     def SetVideoDeviceIndex(self, device_index: int) -> None:
         """
@@ -524,6 +717,8 @@ class DNX64:
 
     def SetEFLC(self, DeviceIndex: int, Quadrant: int, Value: int) -> None:
         """
+        REQUIRES DEVICE WITH EFLC FEATURE
+
         Sets the EFLC value based on the quadrant.
 
         Parameters:
@@ -531,4 +726,19 @@ class DNX64:
             Quadrant (int): Quadrant number (1-4).
             Value (int): EFLC value. (1-31 is the quadrant's brightness level, and 32 is to turn the quadrant off).
         """
+        self._require("SetEFLC", DeviceIndex)
         self.dnx64.SetEFLC(DeviceIndex, Quadrant, Value)
+        known = self._settings_state.get(DeviceIndex)
+        if known is not None:
+            known[("eflc", Quadrant)] = Value
+
+
+from .cache import CachedDNX64
+from .scheduler import CommandScheduler
+from .manager import DeviceLane, DeviceManager
+from .async_api import AsyncDNX64
+from .registry import DeviceInfo, DeviceRegistry
+from .simulator import SimulatedLibrary
+from .tracing import CallTracer
+from .features import REQUIRED_FEATURE, DeviceFeatures, UnsupportedFeatureError
+from .settings import SETTING_FOR_SETTER, DeviceSettings, apply_settings, load_profiles, plan_settings, settings_dict
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Any, Optional
+
+from . import DNX64, METHOD_SIGNATURES
+from .manager import DeviceLane
+from .scheduler import CommandScheduler
+
+
+class AsyncDNX64:
+    """
+    Asyncio counterpart of `DNX64`.
+
+    Every DNX64 method is available as a coroutine with the same name and
+    arguments, plus an optional keyword-only `timeout` in seconds. Calls run
+    on the single worker thread of a `CommandScheduler`, since the DLL is not
+    known to be thread-safe, so awaiting them never blocks the event loop.
+
+    Cancelling a call (or hitting its timeout) removes it from the queue if
+    it has not started yet. A call already inside the DLL cannot be
+    interrupted; the caller simply stops waiting for it.
+
+    Parameters:
+        dnx64: A `CommandScheduler` or `DeviceManager` lane to share, or a
+            `DNX64` instance (or compatible proxy) for which a new scheduler
+            is created.
+        timeout (Optional[float]): Default timeout for every call.
+    """
+
+    def __init__(self, dnx64, timeout: Optional[float] = None) -> None:
+        if isinstance(dnx64, (CommandScheduler, DeviceLane)):
+            self.scheduler = dnx64
+        else:
+            self.scheduler = CommandScheduler(dnx64)
+        self.timeout = timeout
+
+    async def call(self, name: str, *args: Any, timeout: Optional[float] = None, coalesce: bool = True) -> Any:
+        """
+        Await a DNX64 call by method name.
+
+        Parameters:
+            name (str): DNX64 method name.
+            *args: Arguments for the method.
+            timeout (Optional[float]): Seconds to wait; defaults to `self.timeout`.
+            coalesce (bool): See `CommandScheduler.submit`.
+
+        Returns:
+            Any: The method's return value.
+
+        Raises:
+            asyncio.TimeoutError: The call did not finish within `timeout`.
+        """
+        future = self.scheduler.submit(name, *args, coalesce=coalesce)
+        # Cancelling the wrapper cancels the queued command as well.
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout if timeout is not None else self.timeout)
+
+    def close(self) -> None:
+        self.scheduler.close()
+
+
+def _make_method(name: str):
+    async def method(self: AsyncDNX64, *args: Any, timeout: Optional[float] = None) -> Any:
+        return await self.call(name, *args, timeout=timeout)
+
+    method.__name__ = name
+    method.__qualname__ = f"AsyncDNX64.{name}"
+    method.__doc__ = getattr(DNX64, name).__doc__
+    return method
+
+
+for _name in METHOD_SIGNATURES:
+    setattr(AsyncDNX64, _name, _make_method(_name))
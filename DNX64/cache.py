@@ -0,0 +1,226 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+# Queries whose result is fixed for a connected device.
+STATIC_METHODS: Tuple[str, ...] = (
+    "FOVx",
+    "GetConfig",
+    "GetDeviceId",
+    "GetDeviceIDA",
+    "GetLensFinePosLimits",
+    "GetLensPosLimits",
+    "GetVideoDeviceName",
+    "GetVideoProcAmpValueRange",
+    "GetWiFiVideoCaps",
+)
+
+# Setter -> getter whose shadow value the setter updates.
+SHADOWED_SETTERS: Dict[str, Optional[str]] = {
+    "SetAETarget": "GetAETarget",
+    "SetAutoExposure": "GetAutoExposure",
+    "SetExposureValue": "GetExposureValue",
+    "SetVideoProcAmp": "GetVideoProcAmp",
+    # Write-only properties: remembered so callers can read back the last value.
+    "SetAimpointLevel": None,
+    "SetAXILevel": None,
+    "SetFLCLevel": None,
+    "SetFLCSwitch": None,
+    "SetLEDState": None,
+    "SetLensFinePos": None,
+    "SetLensPos": None,
+}
+
+
+class CachedDNX64:
+    """
+    Opt-in read-through cache around a `DNX64` instance.
+
+    Static queries (ranges, limits, configuration, IDs, FOV per magnification)
+    are memoized per device index. Settable values are shadowed: a `Set*`
+    call updates the value its matching `Get*` returns, so polling a value
+    the application itself wrote costs no DLL call. Exposure is only served
+    from the shadow while auto exposure is known to be off, since the camera
+    changes it on its own otherwise. `GetAMR` follows the physical
+    magnification ring and is never cached.
+
+    All other attributes are forwarded to the wrapped object unchanged.
+
+    Parameters:
+        dnx64: `DNX64` instance (or compatible proxy) to wrap.
+    """
+
+    def __init__(self, dnx64) -> None:
+        self._dnx64 = dnx64
+        self._device_index = 0
+        self._static: Dict[Hashable, Any] = {}
+        self._shadow: Dict[Hashable, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name: str):
+        return getattr(self._dnx64, name)
+
+    def _static_call(self, name: str, *args):
+        key = (name, self._device_index) + args
+        if key in self._static:
+            self.hits += 1
+            return self._static[key]
+        self.misses += 1
+        value = getattr(self._dnx64, name)(*args)
+        self._static[key] = value
+        return value
+
+    def _shadow_call(self, name: str, *args):
+        key = (name, self._device_index) + args
+        if key in self._shadow:
+            self.hits += 1
+            return self._shadow[key]
+        self.misses += 1
+        value = getattr(self._dnx64, name)(*args)
+        self._shadow[key] = value
+        return value
+
+    def _remember(self, setter: str, args: tuple) -> None:
+        getter = SHADOWED_SETTERS[setter]
+        *key_args, value = args
+        self._shadow[(getter or setter, self._device_index) + tuple(key_args)] = value
+
+    def invalidate(self, device_index: Optional[int] = None) -> None:
+        """
+        Drop cached and shadowed values.
+
+        Parameters:
+            device_index (Optional[int]): Only drop entries for this DNX64 device
+                (selected with `SetVideoDeviceIndex`). None drops everything.
+        """
+        if device_index is None:
+            self._static.clear()
+            self._shadow.clear()
+            return
+        for store in (self._static, self._shadow):
+            for key in [k for k in store if k[1] == device_index]:
+                del store[key]
+
+    def last_value(self, setter: str, *args) -> Optional[Any]:
+        """
+        Return the value last written with `setter`, or None if unknown.
+
+        Parameters:
+            setter (str): Name of a `Set*` method, e.g. "SetLensPos".
+            *args: Leading arguments of that setter, e.g. the device index.
+        """
+        getter = SHADOWED_SETTERS.get(setter)
+        return self._shadow.get((getter or setter, self._device_index) + args)
+
+    def apply_settings(self, device_index: int, profile, settle: Optional[float] = None) -> List[Tuple[str, tuple]]:
+        """Like `DNX64.apply_settings`, writing through this cache so its shadow stays current."""
+        return self._dnx64._apply_settings(self, device_index, profile, settle)
+
+    # Device selection and enumeration
+
+    def Init(self) -> bool:
+        self.invalidate()
+        return self._dnx64.Init()
+
+    def SetVideoDeviceIndex(self, device_index: int) -> None:
+        self._dnx64.SetVideoDeviceIndex(device_index)
+        self._device_index = device_index
+
+    # Static queries
+
+    def FOVx(self, device_index: int, mag: float) -> float:
+        return self._static_call("FOVx", device_index, mag)
+
+    def GetConfig(self, device_index: int) -> int:
+        return self._static_call("GetConfig", device_index)
+
+    def GetDeviceId(self, device_index: int) -> str:
+        return self._static_call("GetDeviceId", device_index)
+
+    def GetDeviceIDA(self, device_index: int) -> str:
+        return self._static_call("GetDeviceIDA", device_index)
+
+    def GetLensFinePosLimits(self, device_index: int) -> Tuple[int, int]:
+        return self._static_call("GetLensFinePosLimits", device_index)
+
+    def GetLensPosLimits(self, device_index: int) -> Tuple[int, int]:
+        return self._static_call("GetLensPosLimits", device_index)
+
+    def GetVideoDeviceName(self, device_index: int) -> str:
+        return self._static_call("GetVideoDeviceName", device_index)
+
+    def GetVideoProcAmpValueRange(self, prop_value_index: int) -> Tuple[int, int, int, int, int]:
+        return self._static_call("GetVideoProcAmpValueRange", prop_value_index)
+
+    def GetWiFiVideoCaps(self):
+        return self._static_call("GetWiFiVideoCaps")
+
+    # Shadowed values
+
+    def GetAETarget(self, device_index: int) -> int:
+        return self._shadow_call("GetAETarget", device_index)
+
+    def GetAutoExposure(self, device_index: int) -> int:
+        return self._shadow_call("GetAutoExposure", device_index)
+
+    def GetExposureValue(self, device_index: int) -> int:
+        if self._shadow.get(("GetAutoExposure", self._device_index, device_index)) != 0:
+            # Auto exposure on or unknown: the camera owns this value.
+            self.misses += 1
+            return self._dnx64.GetExposureValue(device_index)
+        return self._shadow_call("GetExposureValue", device_index)
+
+    def GetVideoProcAmp(self, prop_value_index: int) -> int:
+        return self._shadow_call("GetVideoProcAmp", prop_value_index)
+
+    def SetAETarget(self, device_index: int, ae_target: int) -> None:
+        self._dnx64.SetAETarget(device_index, ae_target)
+        self._remember("SetAETarget", (device_index, ae_target))
+
+    def SetAutoExposure(self, device_index: int, ae_state: int) -> None:
+        self._dnx64.SetAutoExposure(device_index, ae_state)
+        self._remember("SetAutoExposure", (device_index, ae_state))
+        # The exposure value drifts while AE runs; re-read it afterwards.
+        self._shadow.pop(("GetExposureValue", self._device_index, device_index), None)
+
+    def SetExposureValue(self, device_index: int, exposure_value: int) -> None:
+        self._dnx64.SetExposureValue(device_index, exposure_value)
+        self._remember("SetExposureValue", (device_index, exposure_value))
+
+    def SetVideoProcAmp(self, prop_value_index: int, value: int) -> None:
+        self._dnx64.SetVideoProcAmp(prop_value_index, value)
+        self._remember("SetVideoProcAmp", (prop_value_index, value))
+
+    # Write-only values, remembered for `last_value`
+
+    def SetAimpointLevel(self, device_index: int, apl_level: int) -> None:
+        self._dnx64.SetAimpointLevel(device_index, apl_level)
+        self._remember("SetAimpointLevel", (device_index, apl_level))
+
+    def SetAXILevel(self, device_index: int, axi_level: int) -> None:
+        self._dnx64.SetAXILevel(device_index, axi_level)
+        self._remember("SetAXILevel", (device_index, axi_level))
+
+    def SetFLCLevel(self, device_index: int, flc_level: int) -> None:
+        self._dnx64.SetFLCLevel(device_index, flc_level)
+        self._remember("SetFLCLevel", (device_index, flc_level))
+
+    def SetFLCSwitch(self, device_index: int, flc_quadrant: int) -> None:
+        self._dnx64.SetFLCSwitch(device_index, flc_quadrant)
+        self._remember("SetFLCSwitch", (device_index, flc_quadrant))
+
+    def SetLEDState(self, device_index: int, led_state: int) -> None:
+        self._dnx64.SetLEDState(device_index, led_state)
+        self._remember("SetLEDState", (device_index, led_state))
+
+    def SetLensFinePos(self, device_index: int, lens_fine_position: int) -> None:
+        self._dnx64.SetLensFinePos(device_index, lens_fine_position)
+        self._remember("SetLensFinePos", (device_index, lens_fine_position))
+
+    def SetLensPos(self, device_index: int, lens_position: int) -> None:
+        self._dnx64.SetLensPos(device_index, lens_position)
+        self._remember("SetLensPos", (device_index, lens_position))
+
+    def SetLensInitPos(self, device_index: int) -> None:
+        self._dnx64.SetLensInitPos(device_index)
+        self._shadow.pop(("SetLensPos", self._device_index, device_index), None)
+        self._shadow.pop(("SetLensFinePos", self._device_index, device_index), None)
@@ -0,0 +1,72 @@
+from typing import Dict, List, NamedTuple
+
+# DNX64 method -> DeviceFeatures field the device must have for the call to work.
+REQUIRED_FEATURE: Dict[str, str] = {
+    "GetAMR": "amr",
+    "GetLensFinePosLimits": "edof",
+    "GetLensPosLimits": "edof",
+    "SetAimpointLevel": "aimpoint",
+    "SetAXILevel": "axi",
+    "SetEFLC": "eflc",
+    "SetFLCSwitch": "flc",
+    "SetLensInitPos": "edof",
+    "SetLensFinePos": "edof",
+    "SetLensPos": "edof",
+}
+
+
+class UnsupportedFeatureError(Exception):
+    """A DNX64 method was called on a device whose configuration lacks its feature."""
+
+
+class DeviceFeatures(NamedTuple):
+    """
+    Features of one device, decoded from its `GetConfig` bitmask.
+
+    See https://github.com/dino-lite/DNX64-Python-API/wiki/Appendix:-Parameter-Table#getconfig
+    """
+
+    config: int
+    edof: bool
+    amr: bool
+    eflc: bool
+    aimpoint: bool
+    led_segments: int
+    flc: bool
+    axi: bool
+
+    @classmethod
+    def from_config(cls, config: int) -> "DeviceFeatures":
+        return cls(
+            config=config,
+            edof=bool(config & 0x80),
+            amr=bool(config & 0x40),
+            eflc=bool(config & 0x20),
+            aimpoint=bool(config & 0x10),
+            # 0x4: 2 segments, 0x8: 3 segments, neither: no switchable LED segments.
+            led_segments={0x4: 2, 0x8: 3}.get(config & 0xC, 0),
+            flc=bool(config & 0x2),
+            axi=bool(config & 0x1),
+        )
+
+    def describe(self) -> List[str]:
+        """Return the feature names, e.g. ["EDOF", "AMR", "3 segments LED"]."""
+        names = [
+            name
+            for name, present in (
+                ("EDOF", self.edof),
+                ("AMR", self.amr),
+                ("eFLC", self.eflc),
+                ("Aim Point Laser", self.aimpoint),
+            )
+            if present
+        ]
+        if self.led_segments:
+            names.append(f"{self.led_segments} segments LED")
+        names += [name for name, present in (("FLC", self.flc), ("AXI", self.axi)) if present]
+        return names
+
+    def supports(self, method: str) -> bool:
+        """Return False if `method` needs a feature this device does not have."""
+        feature = REQUIRED_FEATURE.get(method)
+        return feature is None or getattr(self, feature)
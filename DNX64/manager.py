@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from .scheduler import COMMAND_TIME, QUERY_TIME, _enqueue, _execute, _Spacing
+
+# Calls that act on the DLL as a whole rather than on the selected device.
+GLOBAL_METHODS = {"Init", "EnableMicroTouch", "GetVideoDeviceCount", "GetVideoDeviceIndex", "SetEventCallback"}
+# Commands a lane may run back to back before the next busy lane gets a turn.
+LANE_BURST = 8
+
+
+class DeviceLane:
+    """
+    The command queue of one device in a `DeviceManager`.
+
+    Offers the same `submit`/`call` interface as `CommandScheduler`, so it
+    can be wrapped by `AsyncDNX64` or passed to `DeviceRegistry`. Calls need
+    no `SetVideoDeviceIndex` first: the manager selects this lane's device
+    before running them.
+    """
+
+    def __init__(self, manager: "DeviceManager", device_index: int) -> None:
+        self.manager = manager
+        self.device_index = device_index
+        self.coalesced = 0
+        self._queue: deque = deque()
+        self._ready_at = 0.0
+        self._closed = False
+
+    def submit(self, name: str, *args: Any, coalesce: bool = True) -> Future:
+        """Queue a DNX64 call for this device; see `CommandScheduler.submit`."""
+        return self.manager._submit(self, name, args, coalesce)
+
+    def call(self, name: str, *args: Any, timeout: Optional[float] = None) -> Any:
+        """Queue a DNX64 call for this device and block until its result is available."""
+        return self.submit(name, *args).result(timeout)
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def close(self, wait: bool = True) -> None:
+        """Stop accepting commands for this device; queued commands still run."""
+        self.manager._close_lane(self, wait)
+
+
+class DeviceManager(_Spacing):
+    """
+    Drive several DNX64 devices from one process.
+
+    The DLL addresses some functions through a global `SetVideoDeviceIndex`,
+    so calls for different devices must never interleave between selecting a
+    device and using it. The manager owns the only thread that touches the
+    DLL. Each device gets a `DeviceLane` with its own queue, coalescing and
+    spacing. Selecting a device costs a DLL call and its spacing, so the
+    worker drains up to `burst` ready commands from the selected lane before
+    moving on; lanes then take turns round-robin, so a busy device cannot
+    starve the others. While the selected lane waits out its spacing, global
+    calls queued on other lanes may run, since they need no selection, and
+    if the wait is longer than a reselect another ready lane takes over.
+
+    Frame capture does not go through the DLL, so each device's OpenCV
+    capture can run on its own thread in parallel with all of this.
+
+    Parameters:
+        dnx64: `DNX64` instance (or compatible proxy) to drive.
+        spacing (Optional[Dict[str, float]]): Per-method spacing overrides.
+        command_time (float): Spacing after setters not listed in `spacing`.
+        query_time (float): Spacing after getters not listed in `spacing`.
+        burst (int): Commands served from one lane before switching to another.
+    """
+
+    def __init__(
+        self,
+        dnx64,
+        spacing: Optional[Dict[str, float]] = None,
+        command_time: float = COMMAND_TIME,
+        query_time: float = QUERY_TIME,
+        burst: int = LANE_BURST,
+    ) -> None:
+        super().__init__(spacing, command_time, query_time)
+        self.dnx64 = dnx64
+        self.burst = max(1, burst)
+        self.selections = 0
+        self._lanes: Dict[int, DeviceLane] = {}
+        self._order: List[DeviceLane] = []
+        self._turn = 0
+        # Lane being drained and the commands it has run in this turn.
+        self._current: Optional[DeviceLane] = None
+        self._served = 0
+        self._selected: Optional[int] = None
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="dnx64-devices", daemon=True)
+        self._thread.start()
+
+    def lane(self, device_index: int) -> DeviceLane:
+        """Return the lane for a DNX64 device index, creating it on first use."""
+        with self._cond:
+            lane = self._lanes.get(device_index)
+            if lane is None:
+                lane = self._lanes[device_index] = DeviceLane(self, device_index)
+                self._order.append(lane)
+            return lane
+
+    @property
+    def lanes(self) -> List[DeviceLane]:
+        with self._cond:
+            return list(self._order)
+
+    def _submit(self, lane: DeviceLane, name: str, args: tuple, coalesce: bool) -> Future:
+        with self._cond:
+            if not self._running or lane._closed:
+                raise RuntimeError(f"DeviceManager lane {lane.device_index} is closed")
+            future, coalesced = _enqueue(lane._queue, name, args, coalesce)
+            if coalesced:
+                lane.coalesced += 1
+            else:
+                self._cond.notify_all()
+        return future
+
+    def _next(self):
+        # Called with the lock held: the next ready command, or the time to
+        # wait for one. The current lane keeps the worker until it is empty
+        # or has used its burst; then lanes are tried round-robin.
+        now = time.monotonic()
+        current = self._current
+        if current is not None and current._queue and self._served < self.burst:
+            if current._ready_at <= now:
+                self._served += 1
+                return current, current._queue.popleft(), None
+            for lane in self._order:
+                if lane is not current and lane._queue and lane._queue[0].name in GLOBAL_METHODS and lane._ready_at <= now:
+                    return lane, lane._queue.popleft(), None
+            # Keep waiting unless another device could be selected and served sooner.
+            if current._ready_at - now <= self._spacing_for("SetVideoDeviceIndex") or not any(
+                lane is not current and lane._queue and lane._ready_at <= now for lane in self._order
+            ):
+                return None, None, current._ready_at
+        wake_at = None
+        count = len(self._order)
+        for offset in range(count):
+            lane = self._order[(self._turn + offset) % count]
+            if not lane._queue:
+                continue
+            if lane._ready_at <= now:
+                self._turn = (self._turn + offset + 1) % count
+                self._current, self._served = lane, 1
+                return lane, lane._queue.popleft(), None
+            wake_at = lane._ready_at if wake_at is None else min(wake_at, lane._ready_at)
+        return None, None, wake_at
+
+    def _select(self, lane: DeviceLane, command) -> bool:
+        # Select the lane's device; False if the command was requeued or failed.
+        try:
+            self.dnx64.SetVideoDeviceIndex(lane.device_index)
+        except BaseException as e:
+            # Fail only this command; the worker must keep serving the others.
+            self._selected = None
+            for future in command.futures:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return False
+        self._selected = lane.device_index
+        self.selections += 1
+        spacing = self._spacing_for("SetVideoDeviceIndex")
+        if spacing <= 0:
+            return True
+        # Put the command back until the selection has settled instead of
+        # sleeping, so global calls of other lanes can run meanwhile.
+        with self._cond:
+            lane._queue.appendleft(command)
+            lane._ready_at = max(lane._ready_at, time.monotonic() + spacing)
+            self._served -= 1
+        return False
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    lane, command, wake_at = self._next()
+                    if command is not None:
+                        break
+                    if wake_at is None:
+                        if not self._running:
+                            return
+                        self._cond.wait()
+                    else:
+                        # Commands stay queued meanwhile, so writes can coalesce.
+                        self._cond.wait(wake_at - time.monotonic())
+            ran = False
+            if command.name == "SetVideoDeviceIndex":
+                # Selection is the manager's job; keep the lane's own call harmless.
+                command.args = (lane.device_index,)
+                ran = _execute(self.dnx64, command)
+                if ran:
+                    self._selected = lane.device_index
+            elif command.name in GLOBAL_METHODS or self._selected == lane.device_index or self._select(lane, command):
+                ran = _execute(self.dnx64, command)
+                if command.name == "Init":
+                    # Re-initialising may reset the DLL's selection.
+                    self._selected = None
+            if ran:
+                lane._ready_at = time.monotonic() + self._spacing_for(command.name)
+            with self._cond:
+                self._cond.notify_all()
+
+    def _close_lane(self, lane: DeviceLane, wait: bool) -> None:
+        with self._cond:
+            lane._closed = True
+            while wait and lane._queue and self._thread.is_alive() and self._thread is not threading.current_thread():
+                self._cond.wait()
+
+    def close(self, wait: bool = True) -> None:
+        """Stop accepting commands for all devices; queued commands still run."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if wait and self._thread is not threading.current_thread():
+            self._thread.join()
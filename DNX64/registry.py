@@ -0,0 +1,157 @@
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .features import DeviceFeatures
+from .manager import DeviceLane
+from .scheduler import CommandScheduler
+
+
+class DeviceInfo(NamedTuple):
+    """Snapshot of one enumerated Dino-Lite / Dino-Eye device."""
+
+    index: int
+    name: Optional[str]
+    device_id: Optional[str]
+    config: Optional[int]
+    opencv_index: Optional[int]
+
+    @property
+    def features(self) -> Optional[DeviceFeatures]:
+        """The decoded `config`, or None if it could not be read."""
+        return DeviceFeatures.from_config(self.config) if self.config is not None else None
+
+
+class DeviceRegistry:
+    """
+    Enumerate DNX64 devices once and serve lookups from memory.
+
+    `refresh()` calls `Init()` a single time, then records each device's
+    name, ID (`GetDeviceId`, falling back to `GetDeviceIDA`), `GetConfig`
+    bitmask and OpenCV index. Lookups never touch the DLL. Call `refresh()`
+    again after a device is plugged in, or `start()` a periodic background
+    scan; `on_change` callbacks run whenever the device list differs.
+
+    The OpenCV index is taken to be the DNX64 index, since both follow the
+    DirectShow enumeration order. With `probe_opencv=True` each index is
+    opened once per refresh and recorded as None if OpenCV cannot open it.
+
+    Parameters:
+        dnx64: `DNX64` instance, compatible proxy, or a `CommandScheduler` /
+            `DeviceLane` (recommended when other threads also use the device).
+        probe_opencv (bool): Verify OpenCV indices with `cv2.VideoCapture`.
+    """
+
+    def __init__(self, dnx64, probe_opencv: bool = False) -> None:
+        self.dnx64 = dnx64
+        self.probe_opencv = probe_opencv
+        self.refreshed_at: Optional[float] = None
+        self._devices: Dict[int, DeviceInfo] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[List[DeviceInfo]], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _invoke(self, name: str, *args):
+        if isinstance(self.dnx64, (CommandScheduler, DeviceLane)):
+            return self.dnx64.call(name, *args)
+        return getattr(self.dnx64, name)(*args)
+
+    def _query(self, name: str, *args):
+        try:
+            return self._invoke(name, *args)
+        except Exception:
+            return None
+
+    def _probe_opencv_index(self, index: int) -> Optional[int]:
+        import cv2
+
+        capture = cv2.VideoCapture(index, cv2.CAP_DSHOW)
+        try:
+            return index if capture.isOpened() else None
+        finally:
+            capture.release()
+
+    def refresh(self) -> List[DeviceInfo]:
+        """
+        Re-enumerate devices.
+
+        Returns:
+            List[DeviceInfo]: The devices now known, ordered by index.
+        """
+        self._invoke("Init")
+        # Init() was just called; don't let GetVideoDeviceCount repeat it.
+        count = self._invoke("GetVideoDeviceCount", False)
+
+        devices = {}
+        for index in range(count or 0):
+            device_id = self._query("GetDeviceId", index) or self._query("GetDeviceIDA", index)
+            if isinstance(device_id, bytes):
+                device_id = device_id.decode("utf-8", "replace")
+            devices[index] = DeviceInfo(
+                index=index,
+                name=self._query("GetVideoDeviceName", index),
+                device_id=device_id,
+                config=self._query("GetConfig", index),
+                opencv_index=self._probe_opencv_index(index) if self.probe_opencv else index,
+            )
+
+        with self._lock:
+            changed = devices != self._devices
+            self._devices = devices
+            self.refreshed_at = time.time()
+        if changed:
+            for listener in list(self._listeners):
+                listener(list(devices.values()))
+        return list(devices.values())
+
+    def devices(self) -> List[DeviceInfo]:
+        """Return the cached device list, enumerating first if never done."""
+        if self.refreshed_at is None:
+            return self.refresh()
+        with self._lock:
+            return list(self._devices.values())
+
+    def get(self, index: int) -> Optional[DeviceInfo]:
+        """Return the cached entry for a DNX64 device index, or None."""
+        if self.refreshed_at is None:
+            self.refresh()
+        with self._lock:
+            return self._devices.get(index)
+
+    def find(self, device_id: Optional[str] = None, name: Optional[str] = None) -> Optional[DeviceInfo]:
+        """Return the first cached device matching `device_id` and/or `name`."""
+        for device in self.devices():
+            if device_id is not None and device.device_id != device_id:
+                continue
+            if name is not None and device.name != name:
+                continue
+            return device
+        return None
+
+    def on_change(self, listener: Callable[[List[DeviceInfo]], None]) -> None:
+        """Register a callback receiving the new device list after a change."""
+        self._listeners.append(listener)
+
+    def start(self, interval: float = 5.0) -> None:
+        """Rescan every `interval` seconds on a background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def scan() -> None:
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    pass
+
+        self._thread = threading.Thread(target=scan, name="dnx64-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background scan started by `start`."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+
+# Buffer time to allow Dino-Lite to process a command before the next one.
+COMMAND_TIME: float = 0.25
+# Getters return their value synchronously, so nothing needs to wait after them.
+QUERY_TIME: float = 0.0
+
+# Per-method spacing, in seconds, required after a call before the next call
+# may be issued. Unlisted setters use COMMAND_TIME, unlisted getters QUERY_TIME.
+DEFAULT_SPACING: Dict[str, float] = {
+    "Init": 0.1,
+    "SetVideoDeviceIndex": 0.1,
+    "EnableMicroTouch": 0.1,
+    "SetEventCallback": 0.1,
+}
+
+# Setters whose effect depends on every call being made, so never coalesced.
+NON_COALESCED = {"SetVideoDeviceIndex", "SetEventCallback", "SetLensInitPos", "Init"}
+
+
+class _Command:
+    __slots__ = ("name", "args", "key", "futures", "coalesce")
+
+    def __init__(self, name: str, args: tuple, coalesce: bool) -> None:
+        self.name = name
+        self.args = args
+        # Property a setter writes: method plus every argument but the value.
+        self.key = (name,) + args[:-1]
+        # One future per caller, so cancelling one coalesced caller does not
+        # cancel the write for the others.
+        self.futures: list = [Future()]
+        self.coalesce = coalesce
+
+
+def _find_coalescible(queue: deque, command: _Command) -> Optional[_Command]:
+    # Walk back from the newest queued command. Writes to other
+    # properties may be passed over, since each property still ends at
+    # its newest value; anything else (reads, device selection,
+    # non-coalesced sequences, composite writes such as apply_settings)
+    # stops the search, so a newer write is never moved in front of it.
+    for queued in reversed(queue):
+        if not queued.coalesce:
+            return None
+        if queued.key == command.key:
+            return queued
+    return None
+
+
+def _enqueue(queue: deque, name: str, args: tuple, coalesce: bool) -> Tuple[Future, bool]:
+    # Called with the owner's lock held: fold a write into a queued one to the
+    # same property, or append it. Returns the caller's future and whether
+    # the write was folded.
+    command = _Command(name, args, coalesce and name.startswith("Set") and name not in NON_COALESCED)
+    if command.coalesce and args:
+        pending = _find_coalescible(queue, command)
+        if pending is not None:
+            pending.args = args
+            pending.futures.append(command.futures[0])
+            return command.futures[0], True
+    queue.append(command)
+    return command.futures[0], False
+
+
+class _Spacing:
+    # Per-method spacing shared by CommandScheduler and DeviceManager.
+
+    def __init__(self, spacing: Optional[Dict[str, float]], command_time: float, query_time: float) -> None:
+        self.spacing = dict(DEFAULT_SPACING, **(spacing or {}))
+        self.command_time = command_time
+        self.query_time = query_time
+
+    def _spacing_for(self, name: str) -> float:
+        if name in self.spacing:
+            return self.spacing[name]
+        return self.command_time if name.startswith("Set") else self.query_time
+
+
+def _execute(dnx64, command: _Command) -> bool:
+    # Run a command for every caller still waiting; False if all cancelled.
+    futures = [f for f in command.futures if f.set_running_or_notify_cancel()]
+    if not futures:
+        return False
+    try:
+        result = getattr(dnx64, command.name)(*command.args)
+    except BaseException as e:
+        for future in futures:
+            future.set_exception(e)
+    else:
+        for future in futures:
+            future.set_result(result)
+    return True
+
+
+class CommandScheduler(_Spacing):
+    """
+    Serialize all calls to one DNX64 device on a single worker thread.
+
+    Every call is queued and executed in order by the worker, which is the
+    only thread that touches the DLL. Instead of sleeping a fixed time after
+    every command, the worker waits only if the next command arrives before
+    the previous one's spacing has elapsed. Queued writes to the same
+    property (e.g. `SetExposureValue` on one device) are collapsed into the
+    newest value, so a burst of slider updates reaches the hardware once.
+    A collapsed write keeps the queue position of the first one.
+
+    Parameters:
+        dnx64: `DNX64` instance (or compatible proxy) to drive.
+        spacing (Optional[Dict[str, float]]): Per-method spacing overrides.
+        command_time (float): Spacing after setters not listed in `spacing`.
+        query_time (float): Spacing after getters not listed in `spacing`.
+    """
+
+    def __init__(
+        self,
+        dnx64,
+        spacing: Optional[Dict[str, float]] = None,
+        command_time: float = COMMAND_TIME,
+        query_time: float = QUERY_TIME,
+    ) -> None:
+        super().__init__(spacing, command_time, query_time)
+        self.dnx64 = dnx64
+        self.coalesced = 0
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._ready_at = 0.0
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="dnx64-commands", daemon=True)
+        self._thread.start()
+
+    def submit(self, name: str, *args: Any, coalesce: bool = True) -> Future:
+        """
+        Queue a DNX64 call and return a future for its result.
+
+        Parameters:
+            name (str): DNX64 method name, e.g. "SetExposureValue".
+            *args: Arguments for the method.
+            coalesce (bool): Allow a queued write to the same property to be
+                replaced by this one. Pass False for sequences that must all
+                reach the device, such as flashing an LED off and on.
+
+        Returns:
+            Future: Resolves to the method's return value.
+        """
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("CommandScheduler is closed")
+            future, coalesced = _enqueue(self._queue, name, args, coalesce)
+            if coalesced:
+                self.coalesced += 1
+            else:
+                self._cond.notify()
+        return future
+
+    def call(self, name: str, *args: Any, timeout: Optional[float] = None) -> Any:
+        """Queue a DNX64 call and block until its result is available."""
+        return self.submit(name, *args).result(timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if not self._queue:
+                        if not self._running:
+                            return
+                        self._cond.wait()
+                        continue
+                    # Wait out the spacing with the command still queued, so
+                    # writes arriving meanwhile can coalesce into it.
+                    delay = self._ready_at - time.monotonic()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                    command = self._queue.popleft()
+                    break
+            if not _execute(self.dnx64, command):
+                continue
+            self._ready_at = time.monotonic() + self._spacing_for(command.name)
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def close(self, wait: bool = True) -> None:
+        """Stop accepting commands; queued commands still run."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if wait and self._thread is not threading.current_thread():
+            self._thread.join()
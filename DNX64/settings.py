@@ -0,0 +1,177 @@
+import json
+import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Tuple, Union
+
+from .scheduler import COMMAND_TIME
+
+_UNKNOWN = object()
+
+# Setter -> profile field, for setters whose first argument is the device index
+# and last argument the value.
+SETTING_FOR_SETTER: Dict[str, str] = {
+    "SetLEDState": "led_state",
+    "SetFLCSwitch": "flc_switch",
+    "SetFLCLevel": "flc_level",
+    "SetAimpointLevel": "aimpoint_level",
+    "SetAXILevel": "axi_level",
+    "SetAETarget": "ae_target",
+    "SetAutoExposure": "auto_exposure",
+    "SetExposureValue": "exposure",
+    "SetLensPos": "lens_position",
+    "SetLensFinePos": "lens_fine_position",
+}
+
+
+@dataclass
+class DeviceSettings:
+    """
+    A recipe of device settings. Fields left as None are not touched.
+
+    Attributes:
+        led_state (Optional[int]): 0 off, 1 LED set 1, 2 LED set 2 (3-segment models).
+        flc_switch (Optional[int]): FLC quadrant bitmask, 1 to 15.
+        flc_level (Optional[int]): FLC brightness, 1 to 6.
+        eflc (Dict[int, int]): eFLC value per quadrant (1 to 4).
+        aimpoint_level (Optional[int]): Aimpoint laser level.
+        axi_level (Optional[int]): AXI level, 0 to 6.
+        auto_exposure (Optional[int]): 1 on, 0 off.
+        ae_target (Optional[int]): Auto exposure target, 16 to 20.
+        exposure (Optional[int]): Exposure value; skipped only while auto exposure is known to be on.
+        lens_position (Optional[int]): EDOF lens position.
+        lens_fine_position (Optional[int]): EDOF fine lens position.
+    """
+
+    led_state: Optional[int] = None
+    flc_switch: Optional[int] = None
+    flc_level: Optional[int] = None
+    eflc: Dict[int, int] = field(default_factory=dict)
+    aimpoint_level: Optional[int] = None
+    axi_level: Optional[int] = None
+    auto_exposure: Optional[int] = None
+    ae_target: Optional[int] = None
+    exposure: Optional[int] = None
+    lens_position: Optional[int] = None
+    lens_fine_position: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, values: Mapping[str, Any]) -> "DeviceSettings":
+        """
+        Build settings from a mapping, e.g. one profile of a JSON file.
+
+        Raises:
+            ValueError: `values` has a key that is not a setting.
+        """
+        known = {f.name for f in fields(cls)}
+        unknown = set(values) - known
+        if unknown:
+            raise ValueError(f"Unknown device settings: {', '.join(sorted(unknown))}")
+        values = dict(values)
+        # JSON object keys are strings.
+        values["eflc"] = {int(quadrant): value for quadrant, value in (values.get("eflc") or {}).items()}
+        return cls(**values)
+
+
+def load_profiles(path: str) -> Dict[str, DeviceSettings]:
+    """
+    Load named profiles from a JSON file of the form
+    `{"name": {"led_state": 1, "exposure": 2000, "eflc": {"1": 31}, ...}, ...}`.
+
+    Returns:
+        Dict[str, DeviceSettings]: Profile name to settings.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        profiles = json.load(f)
+    return {name: DeviceSettings.from_dict(values) for name, values in profiles.items()}
+
+
+def plan_settings(
+    device_index: int,
+    profile: Union[DeviceSettings, Mapping[str, Any]],
+    known: Optional[Dict[Hashable, Any]] = None,
+) -> List[Tuple[str, tuple]]:
+    """
+    List the DNX64 calls needed to bring a device to `profile`.
+
+    Writes whose value matches `known` (the last values written) are left
+    out. The rest are ordered so each one takes effect: LEDs before FLC/eFLC,
+    auto exposure target and mode before a manual exposure value, and lens
+    moves last since they are the slowest.
+
+    Returns:
+        List[Tuple[str, tuple]]: (method name, arguments) in call order.
+    """
+    return [(method, args) for _, method, args in _plan(device_index, profile, known)]
+
+
+def _plan(device_index, profile, known) -> List[Tuple[Hashable, str, tuple]]:
+    if not isinstance(profile, DeviceSettings):
+        profile = DeviceSettings.from_dict(profile)
+    known = dict(known or {})
+    auto_exposure = known.get("auto_exposure")
+    if profile.auto_exposure is not None and profile.auto_exposure != auto_exposure:
+        # Exposure drifted while auto exposure ran; rewrite it after turning AE off.
+        known.pop("exposure", None)
+        auto_exposure = profile.auto_exposure
+
+    wanted: List[Tuple[Hashable, str, Optional[int], tuple]] = [
+        ("led_state", "SetLEDState", profile.led_state, ()),
+        ("flc_switch", "SetFLCSwitch", profile.flc_switch, ()),
+        ("flc_level", "SetFLCLevel", profile.flc_level, ()),
+    ]
+    wanted += [(("eflc", q), "SetEFLC", v, (q,)) for q, v in sorted(profile.eflc.items())]
+    wanted += [
+        ("aimpoint_level", "SetAimpointLevel", profile.aimpoint_level, ()),
+        ("axi_level", "SetAXILevel", profile.axi_level, ()),
+        ("ae_target", "SetAETarget", profile.ae_target, ()),
+        ("auto_exposure", "SetAutoExposure", profile.auto_exposure, ()),
+        # The camera ignores a manual exposure while auto exposure is on; if
+        # that is not known, write it rather than drop it.
+        ("exposure", "SetExposureValue", profile.exposure if auto_exposure != 1 else None, ()),
+        ("lens_position", "SetLensPos", profile.lens_position, ()),
+        ("lens_fine_position", "SetLensFinePos", profile.lens_fine_position, ()),
+    ]
+    return [
+        (key, method, (device_index,) + extra + (value,))
+        for key, method, value, extra in wanted
+        if value is not None and known.get(key, _UNKNOWN) != value
+    ]
+
+
+def apply_settings(
+    dnx64,
+    device_index: int,
+    profile: Union[DeviceSettings, Mapping[str, Any]],
+    known: Optional[Dict[Hashable, Any]] = None,
+    settle: float = COMMAND_TIME,
+) -> List[Tuple[str, tuple]]:
+    """
+    Write the changed part of `profile` to a device, then wait `settle` once.
+
+    Parameters:
+        dnx64: `DNX64` instance or compatible proxy.
+        device_index (int): Index of the device.
+        profile: `DeviceSettings` or a mapping of its fields.
+        known (Optional[Dict]): Last values written to this device; updated in place.
+        settle (float): Seconds to wait after the last write, if any were made.
+
+    Returns:
+        List[Tuple[str, tuple]]: The calls made, in order.
+    """
+    known = known if known is not None else {}
+    calls = []
+    for key, method, args in _plan(device_index, profile, known):
+        getattr(dnx64, method)(*args)
+        calls.append((method, args))
+        known[key] = args[-1]
+        if key == "auto_exposure" and args[-1]:
+            known.pop("exposure", None)
+    if calls and settle > 0:
+        time.sleep(settle)
+    return calls
+
+
+def settings_dict(profile: DeviceSettings) -> Dict[str, Any]:
+    """Return the fields of `profile` that are set, suitable for JSON."""
+    return {name: value for name, value in asdict(profile).items() if value not in (None, {})}
+
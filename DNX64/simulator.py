@@ -0,0 +1,324 @@
+import ctypes
+import math
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from . import METHOD_SIGNATURES
+
+# EDOF, AMR, eFLC, 3 segments LED, FLC
+DEFAULT_CONFIG: int = 0x80 | 0x40 | 0x20 | 0x8 | 0x2
+# Roughly the horizontal FOV of a 1280 px Dino-Lite sensor at 1x, in um.
+FOV_AT_1X_UM: float = 390000.0
+# index -> (min, max, step, default)
+DEFAULT_PROC_AMP_RANGES: Dict[int, Tuple[int, int, int, int]] = {
+    0: (-64, 64, 1, 0),  # brightness
+    1: (0, 95, 1, 32),  # contrast
+    2: (0, 100, 1, 64),  # hue
+    3: (0, 100, 1, 64),  # saturation
+    4: (0, 7, 1, 3),  # sharpness
+    5: (100, 300, 1, 100),  # gamma
+    7: (2800, 6500, 10, 4600),  # white balance
+    9: (0, 32, 1, 0),  # gain
+}
+
+
+class _DeviceState:
+    def __init__(self, index: int, config: int, amr: float) -> None:
+        self.index = index
+        self.config = config
+        self.amr = amr
+        self.auto_exposure = 1
+        self.exposure = 2000
+        self.ae_target = 18
+        self.led_state = 1
+        self.flc_switch = 15
+        self.flc_level = 6
+        self.eflc = {1: 31, 2: 31, 3: 31, 4: 31}
+        self.aimpoint_level = 0
+        self.axi_level = 0
+        self.lens_limits = (1000, 0)
+        self.lens_fine_limits = (100, 0)
+        self.lens_position = 500
+        self.lens_fine_position = 50
+        self.proc_amp = {index: default for index, (_, _, _, default) in DEFAULT_PROC_AMP_RANGES.items()}
+
+
+class SimulatedLibrary:
+    """
+    Pure-Python stand-in for DNX64.dll.
+
+    Implements every export in METHOD_SIGNATURES with the same calling
+    convention `DNX64` uses for the real library (out-parameters are ctypes
+    objects whose `.value` is filled in), and keeps stateful exposure, LED,
+    FLC/eFLC, lens position and AMR values per device. Every call sleeps
+    for the configured latency plus uniform jitter, so timing-sensitive code
+    can be exercised without hardware.
+
+    Parameters:
+        devices (int): Number of simulated devices.
+        config (int): `GetConfig` bitmask reported by every device.
+        amr (float): Magnification reported by `GetAMR`.
+        latency (float): Base seconds per call.
+        jitter (float): Maximum extra seconds added or removed per call.
+        method_latency (Optional[Dict[str, float]]): Per-method base latency.
+        microtouch_interval (float): If > 0, fire the MicroTouch callback
+            every this many seconds while MicroTouch is enabled.
+        seed (Optional[int]): Seed for the jitter random generator.
+    """
+
+    def __init__(
+        self,
+        devices: int = 1,
+        config: int = DEFAULT_CONFIG,
+        amr: float = 50.0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        method_latency: Optional[Dict[str, float]] = None,
+        microtouch_interval: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.devices = [_DeviceState(i, config, amr) for i in range(devices)]
+        self.latency = latency
+        self.jitter = jitter
+        self.method_latency = dict(method_latency or {})
+        self.calls: Dict[str, int] = {}
+        self.selected_index = 0
+        self.initialized = False
+        self.microtouch_enabled = False
+        self.wifi_resolution = (1280, 960)
+        self._callback: Optional[Callable[[], None]] = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        if microtouch_interval > 0:
+            threading.Thread(
+                target=self._microtouch_loop, args=(microtouch_interval,), name="dnx64-sim-microtouch", daemon=True
+            ).start()
+
+    @classmethod
+    def from_path(cls, path: str) -> "SimulatedLibrary":
+        """
+        Build a simulator from a `simulator?key=value&...` path.
+
+        Recognised keys: devices, config, amr, latency_ms, jitter_ms,
+        microtouch_s, seed.
+        """
+        _, _, query = path.partition("?")
+        options = dict(parse_qsl(query))
+        return cls(
+            devices=int(options.get("devices", 1)),
+            config=int(options.get("config", str(DEFAULT_CONFIG)), 0),
+            amr=float(options.get("amr", 50.0)),
+            latency=float(options.get("latency_ms", 0)) / 1000.0,
+            jitter=float(options.get("jitter_ms", 0)) / 1000.0,
+            microtouch_interval=float(options.get("microtouch_s", 0)),
+            seed=int(options["seed"]) if "seed" in options else None,
+        )
+
+    def exports(self, name: str) -> bool:
+        return name in METHOD_SIGNATURES
+
+    def _call(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            delay = self.method_latency.get(name, self.latency)
+            if self.jitter:
+                delay += self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _device(self, device_index: int) -> _DeviceState:
+        if not 0 <= device_index < len(self.devices):
+            raise OSError(f"Simulated DNX64: no device at index {device_index}")
+        return self.devices[device_index]
+
+    # MicroTouch
+
+    def press_microtouch(self) -> bool:
+        """Simulate a MicroTouch button press; returns True if a callback ran."""
+        if not self.microtouch_enabled or self._callback is None:
+            return False
+        self._callback()
+        return True
+
+    def _microtouch_loop(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            self.press_microtouch()
+
+    # DLL surface
+
+    def Init(self) -> bool:
+        self._call("Init")
+        self.initialized = True
+        return True
+
+    def EnableMicroTouch(self, flag: bool) -> bool:
+        self._call("EnableMicroTouch")
+        self.microtouch_enabled = bool(flag)
+        return True
+
+    def FOVx(self, device_index: int, mag: float) -> float:
+        self._call("FOVx")
+        self._device(device_index)
+        return FOV_AT_1X_UM / mag if mag > 0 else math.inf
+
+    def GetAETarget(self, device_index: int) -> int:
+        self._call("GetAETarget")
+        return self._device(device_index).ae_target
+
+    def GetAMR(self, device_index: int) -> float:
+        self._call("GetAMR")
+        device = self._device(device_index)
+        return device.amr if device.config & 0x40 else 0.0
+
+    def GetAutoExposure(self, device_index: int) -> int:
+        self._call("GetAutoExposure")
+        return self._device(device_index).auto_exposure
+
+    def GetConfig(self, device_index: int) -> int:
+        self._call("GetConfig")
+        return self._device(device_index).config
+
+    def GetDeviceId(self, device_index: int) -> str:
+        self._call("GetDeviceId")
+        return f"SIM{self._device(device_index).index:08d}"
+
+    def GetDeviceIDA(self, device_index: int) -> bytes:
+        self._call("GetDeviceIDA")
+        return f"SIM{self._device(device_index).index:08d}".encode()
+
+    def GetExposureValue(self, device_index: int) -> int:
+        self._call("GetExposureValue")
+        device = self._device(device_index)
+        if device.auto_exposure:
+            # AE keeps nudging the value around its operating point.
+            device.exposure = max(1, device.exposure + self._random.randint(-20, 20))
+        return device.exposure
+
+    def GetLensFinePosLimits(self, device_index: int, upper: ctypes.c_long, lower: ctypes.c_long) -> int:
+        self._call("GetLensFinePosLimits")
+        upper.value, lower.value = self._device(device_index).lens_fine_limits
+        return 1
+
+    def GetLensPosLimits(self, device_index: int, upper: ctypes.c_long, lower: ctypes.c_long) -> int:
+        self._call("GetLensPosLimits")
+        upper.value, lower.value = self._device(device_index).lens_limits
+        return 1
+
+    def GetVideoDeviceCount(self) -> int:
+        self._call("GetVideoDeviceCount")
+        return len(self.devices) if self.initialized else 0
+
+    def GetVideoDeviceIndex(self) -> int:
+        self._call("GetVideoDeviceIndex")
+        return self.selected_index
+
+    def GetVideoDeviceName(self, device_index: int) -> str:
+        self._call("GetVideoDeviceName")
+        return f"Dino-Lite Simulator {self._device(device_index).index}"
+
+    def GetVideoProcAmp(self, prop_value_index: int) -> int:
+        self._call("GetVideoProcAmp")
+        return self._device(self.selected_index).proc_amp.get(prop_value_index, 0)
+
+    def GetVideoProcAmpValueRange(self, prop_value_index, min_val, max_val, stepping, default) -> int:
+        self._call("GetVideoProcAmpValueRange")
+        index = prop_value_index.value if hasattr(prop_value_index, "value") else prop_value_index
+        if index not in DEFAULT_PROC_AMP_RANGES:
+            raise OSError(f"Simulated DNX64: no VideoProcAmp property {index}")
+        min_val.value, max_val.value, stepping.value, default.value = DEFAULT_PROC_AMP_RANGES[index]
+        return 1
+
+    def GetWiFiVideoCaps(self, count, widths, heights) -> bool:
+        self._call("GetWiFiVideoCaps")
+        resolutions = [(640, 480), (1280, 960)]
+        count._obj.value = len(resolutions)
+        for i, (width, height) in enumerate(resolutions):
+            widths[i], heights[i] = width, height
+        return True
+
+    def GetWiFiImage(self, filename: bytes) -> bool:
+        self._call("GetWiFiImage")
+        try:
+            import cv2
+            import numpy as np
+        except ImportError:
+            return False
+        width, height = self.wifi_resolution
+        return bool(cv2.imwrite(filename.decode("utf-8"), np.full((height, width, 3), 128, np.uint8)))
+
+    def SetAETarget(self, device_index: int, ae_target: int) -> None:
+        self._call("SetAETarget")
+        self._device(device_index).ae_target = ae_target
+
+    def SetAutoExposure(self, device_index: int, ae_state: int) -> None:
+        self._call("SetAutoExposure")
+        self._device(device_index).auto_exposure = 1 if ae_state else 0
+
+    def SetAimpointLevel(self, device_index: int, apl_level: int) -> None:
+        self._call("SetAimpointLevel")
+        self._device(device_index).aimpoint_level = apl_level
+
+    def SetAXILevel(self, device_index: int, axi_level: int) -> None:
+        self._call("SetAXILevel")
+        self._device(device_index).axi_level = axi_level
+
+    def SetExposureValue(self, device_index: int, exposure_value: int) -> None:
+        self._call("SetExposureValue")
+        device = self._device(device_index)
+        if not device.auto_exposure:
+            device.exposure = exposure_value
+
+    def SetEFLC(self, device_index: int, quadrant: int, value: int) -> None:
+        self._call("SetEFLC")
+        self._device(device_index).eflc[quadrant] = value
+
+    def SetFLCSwitch(self, device_index: int, flc_quadrant: int) -> None:
+        self._call("SetFLCSwitch")
+        self._device(device_index).flc_switch = flc_quadrant
+
+    def SetFLCLevel(self, device_index: int, flc_level: int) -> None:
+        self._call("SetFLCLevel")
+        self._device(device_index).flc_level = flc_level
+
+    def SetLEDState(self, device_index: int, led_state: int) -> None:
+        self._call("SetLEDState")
+        self._device(device_index).led_state = led_state
+
+    def SetLensInitPos(self, device_index: int) -> None:
+        self._call("SetLensInitPos")
+        device = self._device(device_index)
+        device.lens_position = sum(device.lens_limits) // 2
+        device.lens_fine_position = sum(device.lens_fine_limits) // 2
+
+    def SetLensFinePos(self, device_index: int, lens_fine_position: int) -> None:
+        self._call("SetLensFinePos")
+        device = self._device(device_index)
+        upper, lower = device.lens_fine_limits
+        device.lens_fine_position = min(max(lens_fine_position, lower), upper)
+
+    def SetLensPos(self, device_index: int, lens_position: int) -> None:
+        self._call("SetLensPos")
+        device = self._device(device_index)
+        upper, lower = device.lens_limits
+        device.lens_position = min(max(lens_position, lower), upper)
+
+    def SetVideoDeviceIndex(self, device_index: int) -> None:
+        self._call("SetVideoDeviceIndex")
+        self.selected_index = device_index
+
+    def SetVideoProcAmp(self, prop_value_index: int, value: int) -> None:
+        self._call("SetVideoProcAmp")
+        self._device(self.selected_index).proc_amp[prop_value_index] = value
+
+    def SetEventCallback(self, callback: Callable[[], None]) -> None:
+        self._call("SetEventCallback")
+        self._callback = callback
+
+    def SetWiFiVideoRes(self, width: int, height: int) -> bool:
+        self._call("SetWiFiVideoRes")
+        self.wifi_resolution = (width, height)
+        return True
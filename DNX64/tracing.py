@@ -0,0 +1,189 @@
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds, in seconds. DLL calls range from
+# microseconds (cached getters) to hundreds of milliseconds (lens moves).
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+class MethodStats:
+    """Aggregated timings of one DNX64 method."""
+
+    __slots__ = ("count", "errors", "wall_total", "wall_max", "cpu_total", "buckets", "bounds")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.count = 0
+        self.errors = 0
+        self.wall_total = 0.0
+        self.wall_max = 0.0
+        self.cpu_total = 0.0
+        self.bounds = bounds
+        # One slot per bound plus an overflow slot.
+        self.buckets = [0] * (len(bounds) + 1)
+
+    def add(self, wall: float, cpu: float, failed: bool) -> None:
+        self.count += 1
+        self.errors += failed
+        self.wall_total += wall
+        self.cpu_total += cpu
+        if wall > self.wall_max:
+            self.wall_max = wall
+        self.buckets[bisect.bisect_left(self.bounds, wall)] += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a wall-time quantile as the upper bound of its bucket."""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.wall_max)
+        return self.wall_max
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "wall_mean_s": self.wall_total / self.count if self.count else 0.0,
+            "wall_p50_s": self.quantile(0.5),
+            "wall_p99_s": self.quantile(0.99),
+            "wall_max_s": self.wall_max,
+            "cpu_mean_s": self.cpu_total / self.count if self.count else 0.0,
+            "buckets": dict(zip([str(b) for b in self.bounds] + ["+Inf"], self.buckets)),
+        }
+
+
+class CallTracer:
+    """
+    Record every traced DNX64 call.
+
+    Each call contributes its wall time (`time.perf_counter`) and the CPU time
+    of the calling thread (`time.thread_time`) to a per-method histogram. The
+    last `keep` calls are kept in memory with their arguments, result and
+    thread name. If `path` is given, each call is also appended to that file
+    as one JSON line with short keys:
+
+        {"t": start epoch, "m": method, "a": args, "r": result or "e": error,
+         "th": thread, "w": wall s, "c": cpu s}
+
+    With `keep=0` and no `path` only the histograms are kept, which is cheap
+    enough to leave on; observers added with `add_observer` are told of
+    every call either way.
+
+    Parameters:
+        path (Optional[str]): Trace file to append to.
+        keep (int): Number of recent calls kept by `recent()`.
+        buckets (Tuple[float, ...]): Histogram bucket upper bounds in seconds.
+    """
+
+    def __init__(self, path: Optional[str] = None, keep: int = 1000, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.path = path
+        self.buckets = tuple(sorted(buckets))
+        self._stats: Dict[str, MethodStats] = {}
+        self._recent: deque = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8") if path else None
+        self._observers: List[Callable[[str, float, bool], None]] = []
+
+    def add_observer(self, observer: Callable[[str, float, bool], None]) -> None:
+        """Call `observer(method, wall seconds, failed)` after every recorded call."""
+        self._observers.append(observer)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """Return `func` wrapped so each call is recorded under `name`."""
+
+        def traced(*args, **kwargs):
+            start = time.time()
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                self.record(name, args, None, e, start, time.perf_counter() - wall, time.thread_time() - cpu)
+                raise
+            self.record(name, args, result, None, start, time.perf_counter() - wall, time.thread_time() - cpu)
+            return result
+
+        traced.__name__ = getattr(func, "__name__", name)
+        traced.__doc__ = func.__doc__
+        return traced
+
+    def record(
+        self,
+        name: str,
+        args: tuple,
+        result: Any,
+        error: Optional[BaseException],
+        start: float,
+        wall: float,
+        cpu: float,
+    ) -> None:
+        entry = None
+        if self._recent.maxlen or self._file is not None:
+            thread = threading.current_thread().name
+            entry = {"t": round(start, 6), "m": name, "a": [_plain(a) for a in args], "th": thread, "w": round(wall, 6), "c": round(cpu, 6)}
+            if error is not None:
+                entry["e"] = repr(error)
+            else:
+                entry["r"] = _plain(result)
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = MethodStats(self.buckets)
+            stats.add(wall, cpu, error is not None)
+            if entry is not None:
+                self._recent.append(entry)
+                if self._file is not None:
+                    self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        for observer in self._observers:
+            observer(name, wall, error is not None)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Summarize the calls recorded so far.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per method: count, errors, mean/p50/p99/max
+            wall seconds, mean CPU seconds and the raw bucket counts.
+        """
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in sorted(self._stats.items())}
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """Return the most recent call records, oldest first."""
+        with self._lock:
+            return list(self._recent)
+
+    def reset(self) -> None:
+        """Drop all aggregated statistics and recent records."""
+        with self._lock:
+            self._stats.clear()
+            self._recent.clear()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _plain(value: Any) -> Any:
+    # Keep trace records JSON-serializable without losing the value's meaning.
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return repr(value)
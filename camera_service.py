@@ -1,27 +1,108 @@
+import asyncio
+import bisect
+import itertools
+import json
 import os
+import shutil
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
 import cv2
+import numpy as np
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
+from focus import autofocus, focus_stack, lens_positions, sharpness
+from frame_sources import FrameSource, open_source
+from metrics import Registry
+from mosaic import Mosaic, grid_position
+from tiles import PyramidInfo, build_image_pyramid, mosaic_info, mosaic_layout_key, mosaic_tile_version, render_mosaic_tile
+from waypoints import WaypointStore
+
 try:
-    from DNX64 import DNX64
+    from DNX64 import DNX64, AsyncDNX64, CachedDNX64, DeviceManager, DeviceRegistry, load_profiles, settings_dict
 except Exception:
+    DeviceManager = None  # type: ignore
+    load_profiles = None  # type: ignore
+    settings_dict = None  # type: ignore
+    DeviceRegistry = None  # type: ignore
     DNX64 = None  # type: ignore
+    AsyncDNX64 = None  # type: ignore
+    CachedDNX64 = None  # type: ignore
 
 APP_PORT = int(os.getenv("CAMERA_SERVICE_PORT", "12002"))
 CAPTURE_DIR = Path(os.getenv("CAMERA_CAPTURE_DIR", str(Path(__file__).parent / "captures")))
 CAM_INDEX = int(os.getenv("CAMERA_INDEX", "0"))
+CAMERA_SOURCE = os.getenv("CAMERA_SOURCE", f"usb:{CAM_INDEX}")
 FRAME_WIDTH = int(os.getenv("CAMERA_WIDTH", "1280"))
 FRAME_HEIGHT = int(os.getenv("CAMERA_HEIGHT", "960"))
 FRAME_FPS = int(os.getenv("CAMERA_FPS", "30"))
+JPEG_QUALITY = int(os.getenv("CAMERA_JPEG_QUALITY", "95"))
+JPEG_CACHE_SIZE = int(os.getenv("CAMERA_JPEG_CACHE_SIZE", "8"))
+MJPG_PASSTHROUGH = os.getenv("CAMERA_MJPG_PASSTHROUGH", "0") == "1"
+CAPTURE_WRITERS = int(os.getenv("CAMERA_CAPTURE_WRITERS", "2"))
+CAPTURE_QUEUE_MAX = int(os.getenv("CAMERA_CAPTURE_QUEUE_MAX", "64"))
+CAPTURE_JOB_HISTORY = 256
+BURST_MAX_FRAMES = int(os.getenv("CAMERA_BURST_MAX_FRAMES", "60"))
+# Frame history for /capture with `at`/`offset_ms`. Off by default: it copies
+# every decoded frame on the grab thread.
+HISTORY_SECONDS = float(os.getenv("CAMERA_HISTORY_SECONDS", "0"))
+HISTORY_MAX_MB = int(os.getenv("CAMERA_HISTORY_MAX_MB", "64"))
+EDOF_STEPS = int(os.getenv("CAMERA_EDOF_STEPS", "12"))
+EDOF_MAX_STEPS = int(os.getenv("CAMERA_EDOF_MAX_STEPS", "64"))
+EDOF_SETTLE_MS = float(os.getenv("CAMERA_EDOF_SETTLE_MS", "100"))
+AF_SETTLE_MS = float(os.getenv("CAMERA_AF_SETTLE_MS", "30"))
+WAYPOINT_STORE = os.getenv("CAMERA_WAYPOINT_STORE", str(Path(__file__).parent / "waypoints.json"))
+# A stored lens position is kept if the frame is at least this sharp relative
+# to when it was saved; otherwise only +/- WAYPOINT_SEARCH_RANGE around it is searched.
+WAYPOINT_MIN_SHARPNESS = float(os.getenv("CAMERA_WAYPOINT_MIN_SHARPNESS", "0.8"))
+WAYPOINT_SEARCH_RANGE = int(os.getenv("CAMERA_WAYPOINT_SEARCH_RANGE", "60"))
+# Stored values are ignored if the magnification changed by more than this.
+WAYPOINT_AMR_TOLERANCE = 0.5
+# "1" stitches every /capture and /capture/edof image into a per-tool mosaic
+# as it arrives. Without `mosaic_x`/`mosaic_y` in the payload, a capture is
+# first placed by its waypoint on a grid of MOSAIC_COLUMNS per row, MOSAIC_STEP
+# pixels apart (rows alternate direction if MOSAIC_SERPENTINE), then registered.
+MOSAIC_ENABLED = os.getenv("CAMERA_MOSAIC", "0") == "1"
+MOSAIC_DIR = Path(os.getenv("CAMERA_MOSAIC_DIR", str(CAPTURE_DIR / "mosaics")))
+MOSAIC_COLUMNS = int(os.getenv("CAMERA_MOSAIC_COLUMNS", "10"))
+MOSAIC_STEP = (
+    int(os.getenv("CAMERA_MOSAIC_STEP_X", str(int(FRAME_WIDTH * 0.8)))),
+    int(os.getenv("CAMERA_MOSAIC_STEP_Y", str(int(FRAME_HEIGHT * 0.8)))),
+)
+MOSAIC_SERPENTINE = os.getenv("CAMERA_MOSAIC_SERPENTINE", "1") == "1"
+# Tile pyramids for /tiles: built on TILE_WORKERS processes on first request
+# and cached under TILE_CACHE. Capture tiles may be cached by clients for
+# TILE_MAX_AGE seconds; mosaic tiles change as images arrive and are always revalidated.
+TILE_CACHE = Path(os.getenv("CAMERA_TILE_CACHE", str(CAPTURE_DIR / ".tiles")))
+TILE_SIZE = int(os.getenv("CAMERA_TILE_SIZE", "256"))
+TILE_QUALITY = int(os.getenv("CAMERA_TILE_QUALITY", "85"))
+TILE_WORKERS = int(os.getenv("CAMERA_TILE_WORKERS", "2"))
+TILE_MAX_AGE = int(os.getenv("CAMERA_TILE_MAX_AGE", "86400"))
+MOSAIC_TILE_PREFIX = "mosaic-"
 DNX64_DLL_PATH = os.getenv("DNX64_DLL_PATH", "")
 DNX64_DEVICE_INDEX = int(os.getenv("DNX64_DEVICE_INDEX", "0"))
+# Every DNX64 device index this service controls; `device=` selects one in /params.
+DNX64_DEVICES = [int(i) for i in os.getenv("DNX64_DEVICES", str(DNX64_DEVICE_INDEX)).split(",") if i.strip()]
+if DNX64_DEVICE_INDEX not in DNX64_DEVICES:
+    DNX64_DEVICES.insert(0, DNX64_DEVICE_INDEX)
+DNX64_CACHE = os.getenv("DNX64_CACHE", "1") == "1"
+DNX64_CALL_TIMEOUT = float(os.getenv("DNX64_CALL_TIMEOUT", "2"))
+# Spacing after lens moves. Focus routines wait for the lens themselves and
+# check the result on a frame, so the generic command time is not needed.
+DNX64_LENS_SPACING_MS = float(os.getenv("DNX64_LENS_SPACING_MS", "50"))
+DNX64_SCAN_INTERVAL = float(os.getenv("DNX64_SCAN_INTERVAL", "0"))
+# "1" traces DNX64 calls in memory; any other non-empty value is a trace file path.
+DNX64_TRACE = os.getenv("DNX64_TRACE", "")
+# JSON file of named settings profiles for POST /profiles/{name}.
+DNX64_PROFILES = os.getenv("DNX64_PROFILES", "")
 DNX64_EXPOSURE_INDEX = os.getenv("DNX64_EXPOSURE_INDEX")
 DNX64_GAIN_INDEX = os.getenv("DNX64_GAIN_INDEX", "9")
 DEFAULT_EXPOSURE_MIN = int(os.getenv("CAMERA_EXPOSURE_MIN", "1"))
@@ -44,36 +125,300 @@ app.add_middleware(
 
 app.mount("/captures", StaticFiles(directory=str(CAPTURE_DIR)), name="captures")
 
-_camera: Optional[cv2.VideoCapture] = None
-_dnx64: Optional[object] = None
+_camera: Optional[FrameSource] = None
+_grabber: Optional["_FrameGrabber"] = None
+_jpeg_cache: Optional["_JpegCache"] = None
+_stream_clients: dict[int, "_StreamClient"] = {}
+_stream_client_ids = itertools.count(1)
+_capture_writer: Optional["_CaptureWriter"] = None
+_burst_ring: Optional["_FrameRing"] = None
+_burst_ring_busy = False
+# Set while an EDOF sweep or autofocus drives the lens.
+_lens_busy = False
+_waypoint_store: Optional[WaypointStore] = None
+# tool_id -> its mosaic; captures are stitched in order on one worker.
+_mosaics: dict[str, Mosaic] = {}
+_mosaic_executor: Optional[ThreadPoolExecutor] = None
+_tile_pool: Optional[ProcessPoolExecutor] = None
+# Pyramid builds and tile renders in flight, so concurrent requests share one job.
+_tile_jobs: dict[str, asyncio.Future] = {}
+_background_tasks: set = set()
+_dnx64: Optional["AsyncDNX64"] = None
+# The bare DNX64 under the proxies in _dnx64, for tracing.
+_dnx64_device: Optional["DNX64"] = None
+# DNX64_DEVICES index -> its lane of the shared DeviceManager; _dnx64 is the primary one.
+_dnx64_devices: dict[int, "AsyncDNX64"] = {}
+_profiles: dict = {}
+_profiles_mtime: Optional[float] = None
+_device_registry: Optional["DeviceRegistry"] = None
+
+_metrics = Registry()
+_grab_seconds = _metrics.histogram("camera_frame_grab_seconds", "Time spent in cam.read() per frame.")
+_encode_seconds = _metrics.histogram("camera_frame_encode_seconds", "Time spent JPEG-encoding one frame.")
+_send_seconds = _metrics.histogram("camera_client_send_seconds", "Time for one /mjpeg client to accept a frame.")
+_stream_lag_frames = _metrics.histogram(
+    "camera_client_lag_frames",
+    "Frames published while a /mjpeg client was sending, i.e. its queue depth.",
+    buckets=(0, 1, 2, 4, 8, 16, 32),
+)
+_frames_grabbed = _metrics.counter("camera_frames_grabbed_total", "Frames read from the camera.")
+_frames_sent = _metrics.counter("camera_frames_sent_total", "Frames delivered to /mjpeg clients.")
+_frames_dropped = _metrics.counter("camera_frames_dropped_total", "Frames /mjpeg clients could not keep up with.")
+_capture_write_seconds = _metrics.histogram("camera_capture_write_seconds", "Encode and write time of one capture.")
+_mosaic_add_seconds = _metrics.histogram("camera_mosaic_add_seconds", "Registration and blending time of one mosaic image.")
+_mosaic_failures = _metrics.counter("camera_mosaic_failures_total", "Captures that could not be added to a mosaic.")
+_dnx64_call_seconds = _metrics.histogram("dnx64_call_seconds", "Latency of DNX64 SDK calls.", labels=("method",))
+_metrics.gauge("camera_mjpeg_clients", "Connected /mjpeg clients.", lambda: len(_stream_clients))
+_metrics.gauge(
+    "camera_capture_queue_depth",
+    "Captures waiting to be written.",
+    lambda: _capture_writer.pending if _capture_writer is not None else 0,
+)
+
+
+class _FrameGrabber:
+    """
+    Own the only reader of a camera and publish its latest frame.
+
+    A single background thread calls `cam.read()` at the sensor rate and
+    stores the newest frame together with a monotonically increasing sequence
+    number. Any number of subscribers wait on the condition for a sequence
+    newer than the one they last saw, so adding clients never adds reads.
+    """
+
+    def __init__(self, cam: FrameSource) -> None:
+        self._cam = cam
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = 0.0
+        self._running = True
+        self._async_waiters: set = set()
+        self._history: Optional[_FrameRing] = None
+        self._history_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while self._running:
+            start = time.perf_counter()
+            ok, frame = self._cam.read()
+            if not ok or frame is None:
+                time.sleep(0.2)
+                continue
+            _grab_seconds.observe(time.perf_counter() - start)
+            _frames_grabbed.inc()
+            with self._cond:
+                self._seq += 1
+                self._frame = frame
+                self._timestamp = time.time()
+                self._cond.notify_all()
+                self._wake_async_waiters()
+                seq, timestamp = self._seq, self._timestamp
+            self._record_history(seq, frame, timestamp)
+
+    def _record_history(self, seq: int, frame, timestamp: float) -> None:
+        if HISTORY_SECONDS <= 0:
+            return
+        with self._history_lock:
+            if self._history is None:
+                capacity = int(HISTORY_SECONDS * max(FRAME_FPS, 1))
+                if not _is_jpeg_buffer(frame):
+                    capacity = min(capacity, HISTORY_MAX_MB * 1024 * 1024 // max(frame.nbytes, 1))
+                self._history = _FrameRing(max(capacity, 1))
+            self._history.push(seq, frame, timestamp)
+
+    def frame_at(self, timestamp: float):
+        """
+        Return a copy of the buffered frame nearest to `timestamp`.
+
+        Returns:
+            Tuple of `(seq, frame, timestamp)`, or None if nothing is buffered.
+        """
+        with self._history_lock:
+            if self._history is None or not len(self._history):
+                return None
+            entries = self._history.entries()
+            times = [entry[2] for entry in entries]
+            index = bisect.bisect_left(times, timestamp)
+            candidates = entries[max(index - 1, 0) : index + 1]
+            seq, frame, frame_time = min(candidates, key=lambda entry: abs(entry[2] - timestamp))
+            # Ring slots are overwritten by the grab thread, so hand out a copy.
+            return seq, frame.copy(), frame_time
+
+    def _wake_async_waiters(self) -> None:
+        # Called with the condition held.
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_resolve_future, future)
+        self._async_waiters.clear()
 
+    def latest(self):
+        """Return `(seq, frame, timestamp)` of the newest frame, `seq` 0 if none yet."""
+        with self._cond:
+            return self._seq, self._frame, self._timestamp
 
-def _init_dnx64() -> Optional[object]:
-    global _dnx64
+    def wait_next(self, last_seq: int, timeout: float = 1.0):
+        """
+        Block until a frame newer than `last_seq` is published.
+
+        Returns:
+            Tuple of `(seq, frame, timestamp)`, or None on timeout or stop.
+        """
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self._seq > last_seq or not self._running, timeout
+            ):
+                return None
+            if not self._running:
+                return None
+            return self._seq, self._frame, self._timestamp
+
+    async def wait_next_async(self, last_seq: int, timeout: float = 1.0):
+        """
+        Await a frame newer than `last_seq` without occupying a worker thread.
+
+        Returns:
+            Tuple of `(seq, frame, timestamp)`, or None on timeout or stop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if not self._running:
+                return None
+            if self._seq > last_seq:
+                return self._seq, self._frame, self._timestamp
+            waiter = (loop, loop.create_future())
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+        with self._cond:
+            if not self._running or self._seq <= last_seq:
+                return None
+            return self._seq, self._frame, self._timestamp
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            self._wake_async_waiters()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+
+
+def _resolve_future(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _StreamClient:
+    """Delivery state and counters of one `/mjpeg` subscriber."""
+
+    def __init__(self, client_id: int, fps: float) -> None:
+        self.client_id = client_id
+        self.fps = fps
+        self.sent = 0
+        self.dropped = 0
+        self.connected_at = time.time()
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.client_id,
+            "fps": self.fps,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "connected_s": round(time.time() - self.connected_at, 1),
+        }
+
+
+def _init_dnx64() -> Optional["AsyncDNX64"]:
+    global _dnx64, _dnx64_device
     if _dnx64 is not None:
         return _dnx64
     if not DNX64 or not DNX64_DLL_PATH:
         return None
     try:
-        _dnx64 = DNX64(DNX64_DLL_PATH)
-        _dnx64.SetVideoDeviceIndex(DNX64_DEVICE_INDEX)
-        time.sleep(0.1)
+        _dnx64_device = DNX64(DNX64_DLL_PATH)
+        # The tracer always feeds dnx64_call_seconds; DNX64_TRACE adds the
+        # per-call records served by /dnx64/trace.
+        tracer = _dnx64_device.enable_tracing(
+            None if DNX64_TRACE in ("", "1") else DNX64_TRACE, keep=1000 if DNX64_TRACE else 0
+        )
+        tracer.add_observer(lambda method, wall, failed: _dnx64_call_seconds.observe(wall, method))
+        microscope = _dnx64_device
+        if DNX64_CACHE:
+            # Ranges, limits and values this service wrote are served locally.
+            microscope = CachedDNX64(microscope)
+        # Every DLL call goes through one worker that selects the device,
+        # paces and coalesces per device, and serves devices in turn; routes
+        # await it so a slow call never blocks the event loop.
+        lens_spacing = DNX64_LENS_SPACING_MS / 1000.0
+        manager = DeviceManager(microscope, spacing={"SetLensPos": lens_spacing, "SetLensFinePos": lens_spacing})
+        for index in DNX64_DEVICES:
+            _dnx64_devices[index] = AsyncDNX64(manager.lane(index), timeout=DNX64_CALL_TIMEOUT)
+        _dnx64 = _dnx64_devices[DNX64_DEVICE_INDEX]
         return _dnx64
     except Exception:
         _dnx64 = None
         return None
 
 
-def _init_camera() -> cv2.VideoCapture:
+def _dnx64_for(device: Optional[int]) -> Optional["AsyncDNX64"]:
+    dnx64 = _init_dnx64()
+    if device is None or dnx64 is None:
+        return dnx64
+    if device not in _dnx64_devices:
+        raise HTTPException(status_code=404, detail=f"DNX64 device {device} is not in DNX64_DEVICES")
+    return _dnx64_devices[device]
+
+
+def _load_profiles() -> dict:
+    global _profiles, _profiles_mtime
+    if not DNX64_PROFILES or load_profiles is None:
+        return {}
+    try:
+        mtime = os.path.getmtime(DNX64_PROFILES)
+    except OSError:
+        return {}
+    # Re-read only when the file changes, so profiles can be edited live.
+    if mtime != _profiles_mtime:
+        try:
+            _profiles = load_profiles(DNX64_PROFILES)
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=f"Invalid DNX64_PROFILES: {e}")
+        _profiles_mtime = mtime
+    return _profiles
+
+
+def _init_device_registry() -> Optional["DeviceRegistry"]:
+    global _device_registry
+    if _device_registry is not None:
+        return _device_registry
+    dnx64 = _init_dnx64()
+    if dnx64 is None:
+        return None
+    _device_registry = DeviceRegistry(dnx64.scheduler)
+    if DNX64_SCAN_INTERVAL > 0:
+        _device_registry.start(DNX64_SCAN_INTERVAL)
+    return _device_registry
+
+
+def _init_camera() -> FrameSource:
     global _camera
     if _camera is not None and _camera.isOpened():
         return _camera
 
-    cam = cv2.VideoCapture(CAM_INDEX, cv2.CAP_DSHOW)
-    cam.set(cv2.CAP_PROP_FPS, FRAME_FPS)
-    cam.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter.fourcc("M", "J", "P", "G"))
-    cam.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-    cam.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+    try:
+        cam = open_source(CAMERA_SOURCE, FRAME_WIDTH, FRAME_HEIGHT, FRAME_FPS, MJPG_PASSTHROUGH)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
     if not cam.isOpened():
         raise HTTPException(status_code=503, detail="Camera not available")
@@ -82,8 +427,22 @@ def _init_camera() -> cv2.VideoCapture:
     return cam
 
 
+def _init_grabber() -> _FrameGrabber:
+    global _grabber
+    cam = _init_camera()
+    if _grabber is None:
+        _grabber = _FrameGrabber(cam)
+    return _grabber
+
+
 def _close_camera():
-    global _camera
+    global _camera, _grabber
+    if _grabber is not None:
+        _grabber.stop()
+        _grabber = None
+    if _jpeg_cache is not None:
+        # Sequence numbers restart with the next grabber.
+        _jpeg_cache.clear()
     if _camera is not None:
         try:
             _camera.release()
@@ -92,38 +451,475 @@ def _close_camera():
     _camera = None
 
 
-def _encode_frame(frame) -> bytes:
-    ok, encoded = cv2.imencode(".jpg", frame)
+def _is_jpeg_buffer(frame) -> bool:
+    """Return True if `frame` is a compressed MJPG buffer rather than pixels."""
+    return (
+        frame is not None
+        and frame.dtype == "uint8"
+        and (frame.ndim == 1 or (frame.ndim == 2 and frame.shape[0] == 1))
+        and frame.size > 2
+        and frame.flat[0] == 0xFF
+        and frame.flat[1] == 0xD8
+    )
+
+
+def _frame_pixels(frame):
+    """Return BGR pixels for `frame`, decoding passthrough buffers on demand."""
+    if not _is_jpeg_buffer(frame):
+        return frame
+    pixels = cv2.imdecode(frame.reshape(-1), cv2.IMREAD_COLOR)
+    if pixels is None:
+        raise HTTPException(status_code=500, detail="Failed to decode frame")
+    return pixels
+
+
+def _encode_frame(frame, quality: int = JPEG_QUALITY) -> bytes:
+    if _is_jpeg_buffer(frame):
+        # Passthrough: the camera already encoded it, forward as-is.
+        return frame.tobytes()
+    with _encode_seconds.time():
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
     if not ok:
         raise HTTPException(status_code=500, detail="Failed to encode frame")
     return encoded.tobytes()
 
 
-def _get_video_proc_range(dnx64, index_env: str | None):
+class _JpegCache:
+    """
+    Encode each frame at most once per JPEG quality and share the bytes.
+
+    Entries are keyed by `(seq, quality)` and evicted oldest-first once more
+    than `max_entries` are held. Concurrent requests for a key that is being
+    encoded wait for the first encoder instead of encoding it again.
+    """
+
+    def __init__(self, max_entries: int = JPEG_CACHE_SIZE) -> None:
+        self._max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple[int, int], bytes]" = OrderedDict()
+        self._pending: dict[tuple[int, int], threading.Event] = {}
+
+    def get(self, seq: int, frame, quality: int = JPEG_QUALITY) -> bytes:
+        key = (seq, int(quality))
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                return data
+            event = self._pending.get(key)
+            owner = event is None
+            if owner:
+                event = self._pending[key] = threading.Event()
+
+        if not owner:
+            event.wait()
+            with self._lock:
+                data = self._entries.get(key)
+            if data is not None:
+                return data
+            return _encode_frame(frame, quality)
+
+        data = None
+        try:
+            data = _encode_frame(frame, quality)
+            return data
+        finally:
+            with self._lock:
+                if data is not None:
+                    self._entries[key] = data
+                    while len(self._entries) > self._max_entries:
+                        self._entries.popitem(last=False)
+                self._pending.pop(key, None)
+            event.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _init_jpeg_cache() -> _JpegCache:
+    global _jpeg_cache
+    if _jpeg_cache is None:
+        _jpeg_cache = _JpegCache()
+    return _jpeg_cache
+
+
+class _FrameRing:
+    """
+    Fixed-capacity ring of `(seq, frame, timestamp)` entries.
+
+    Decoded frames are copied into one preallocated array, so a ring that is
+    reused does not allocate per frame. Compressed passthrough buffers vary in
+    size and are kept by reference instead.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(1, capacity)
+        self._slots: Optional[np.ndarray] = None
+        self._entries: list = [None] * self.capacity
+        self._head = 0
+        self._count = 0
+
+    def clear(self) -> None:
+        self._entries = [None] * self.capacity
+        self._head = 0
+        self._count = 0
+
+    def push(self, seq: int, frame, timestamp: float) -> None:
+        index = self._head
+        if not _is_jpeg_buffer(frame):
+            if self._slots is None or self._slots.shape[1:] != frame.shape or self._slots.dtype != frame.dtype:
+                self._slots = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+            np.copyto(self._slots[index], frame)
+            frame = self._slots[index]
+        self._entries[index] = (seq, frame, timestamp)
+        self._head = (index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def entries(self) -> list:
+        """Return the held entries, oldest first."""
+        start = (self._head - self._count) % self.capacity
+        return [self._entries[(start + i) % self.capacity] for i in range(self._count)]
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class _CaptureWriter:
+    """
+    Encode and write captures on a bounded worker pool.
+
+    `submit` returns at once with a job record; the JPEG is produced through
+    the shared cache and written by one of `workers` threads. At most
+    `queue_max` jobs may be pending, and the last `CAPTURE_JOB_HISTORY` jobs
+    are kept so clients can poll or await them by `image_id`.
+    """
+
+    def __init__(self, workers: int = CAPTURE_WRITERS, queue_max: int = CAPTURE_QUEUE_MAX) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="capture-writer")
+        self._queue_max = max(1, queue_max)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+
+    def submit(self, image_id: str, seq: int, frame, quality: int) -> Tuple[Future, dict]:
+        future, jobs = self.submit_batch([(image_id, seq, frame)], quality, use_cache=True)
+        return future, jobs[0]
+
+    def submit_batch(self, items: list, quality: int, use_cache: bool = False) -> Tuple[Future, list]:
+        """
+        Queue `(image_id, seq, frame)` items to be written in order by one worker.
+
+        Batches bypass the shared JPEG cache by default so that a burst does
+        not evict the frames live streams are about to reuse.
+
+        Returns:
+            Tuple[Future, list]: The batch's future and one job record per item.
+            Keep the records: `job()` forgets them after `CAPTURE_JOB_HISTORY` newer jobs.
+        """
+        with self._lock:
+            if self._pending + len(items) > self._queue_max:
+                raise HTTPException(status_code=503, detail="Capture queue is full")
+            self._pending += len(items)
+            jobs = []
+            for image_id, _, _ in items:
+                job = {"status": "pending", "error": None}
+                jobs.append(job)
+                self._jobs[image_id] = job
+                self._jobs.move_to_end(image_id)
+            future = self._executor.submit(self._write, list(zip(jobs, items)), quality, use_cache)
+            for job in jobs:
+                job["future"] = future
+            while len(self._jobs) > CAPTURE_JOB_HISTORY:
+                self._jobs.popitem(last=False)
+        return future, jobs
+
+    def _write(self, batch: list, quality: int, use_cache: bool) -> None:
+        failed = None
+        for job, (image_id, seq, frame) in batch:
+            start = time.perf_counter()
+            try:
+                if use_cache:
+                    data = _init_jpeg_cache().get(seq, frame, quality)
+                else:
+                    data = _encode_frame(frame, quality)
+                (CAPTURE_DIR / image_id).write_bytes(data)
+                job["status"] = "done"
+                _capture_write_seconds.observe(time.perf_counter() - start)
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(getattr(e, "detail", e))
+                failed = failed or e
+            finally:
+                with self._lock:
+                    self._pending -= 1
+        if failed is not None:
+            raise failed
+
+    def job(self, image_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._jobs.get(image_id)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+
+def _init_capture_writer() -> _CaptureWriter:
+    global _capture_writer
+    if _capture_writer is None:
+        _capture_writer = _CaptureWriter()
+    return _capture_writer
+
+
+def _capture_status(image_id: str, job: dict) -> dict:
+    return {
+        "image_id": image_id,
+        "image_url": f"/captures/{image_id}",
+        "status": job["status"],
+        "error": job["error"],
+    }
+
+
+async def _get_video_proc_range(dnx64, index_env: str | None):
     if dnx64 is None or not index_env:
         return None
     try:
         idx = int(index_env)
-        _, min_val, max_val, step, default = dnx64.GetVideoProcAmpValueRange(idx)
+        _, min_val, max_val, step, default = await dnx64.GetVideoProcAmpValueRange(idx)
         return {"min": int(min_val), "max": int(max_val), "step": int(step), "default": int(default)}
     except Exception:
         return None
 
 
-def _get_focus_range(dnx64):
+async def _get_focus_range(dnx64, device_index: int = DNX64_DEVICE_INDEX):
     if dnx64 is None:
         return None
     try:
-        upper, lower = dnx64.GetLensPosLimits(DNX64_DEVICE_INDEX)
+        upper, lower = await dnx64.GetLensPosLimits(device_index)
         return {"min": int(min(lower, upper)), "max": int(max(lower, upper))}
     except Exception:
         return None
 
 
+async def _get_features(dnx64, device_index: int = DNX64_DEVICE_INDEX):
+    if dnx64 is None:
+        return None
+    try:
+        return await dnx64.call("features", device_index)
+    except Exception:
+        return None
+
+
+def _init_waypoint_store() -> WaypointStore:
+    global _waypoint_store
+    if _waypoint_store is None:
+        _waypoint_store = WaypointStore(WAYPOINT_STORE)
+    return _waypoint_store
+
+
+def _init_mosaic(tool_id) -> Mosaic:
+    key = str(tool_id)
+    if not key or "/" in key or "\\" in key or key.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid tool_id")
+    if key not in _mosaics:
+        _mosaics[key] = Mosaic(MOSAIC_DIR / f"t{key}")
+    return _mosaics[key]
+
+
+def _queue_mosaic(payload: dict, image_id: str, frame) -> bool:
+    """Stitch a capture into its tool's mosaic in the background; returns False if mosaics are off."""
+    global _mosaic_executor
+    if not payload.get("mosaic", MOSAIC_ENABLED):
+        return False
+    mosaic = _init_mosaic(payload.get("tool_id", 0))
+    if "mosaic_x" in payload and "mosaic_y" in payload:
+        guess = (int(payload["mosaic_x"]), int(payload["mosaic_y"]))
+    else:
+        guess = grid_position(int(payload.get("waypoint_index", 0)), MOSAIC_COLUMNS, MOSAIC_STEP, MOSAIC_SERPENTINE)
+    if _mosaic_executor is None:
+        _mosaic_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mosaic")
+
+    def add() -> None:
+        start = time.perf_counter()
+        try:
+            mosaic.add(image_id, _frame_pixels(frame), guess)
+        except Exception:
+            _mosaic_failures.inc()
+            raise
+        _mosaic_add_seconds.observe(time.perf_counter() - start)
+
+    _mosaic_executor.submit(add)
+    return True
+
+
+def _init_tile_pool() -> ProcessPoolExecutor:
+    global _tile_pool
+    if _tile_pool is None:
+        _tile_pool = ProcessPoolExecutor(max_workers=max(1, TILE_WORKERS))
+    return _tile_pool
+
+
+async def _in_tile_pool(key: str, fn, *args):
+    """Run `fn(*args)` on a tile worker process, joining a job already running under `key`."""
+    job = _tile_jobs.get(key)
+    if job is None:
+        job = asyncio.wrap_future(_init_tile_pool().submit(fn, *args))
+        _tile_jobs[key] = job
+        job.add_done_callback(lambda _: _tile_jobs.pop(key, None))
+    try:
+        return await asyncio.shield(job)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Tile rendering failed: {e}")
+
+
+def _tile_mosaic(image_id: str) -> Optional[Mosaic]:
+    """The mosaic an image_id names, or None if it names a capture."""
+    if not image_id.startswith(MOSAIC_TILE_PREFIX):
+        return None
+    mosaic = _init_mosaic(image_id[len(MOSAIC_TILE_PREFIX) :])
+    if mosaic.bounds is None:
+        raise HTTPException(status_code=404, detail="Mosaic is empty")
+    return mosaic
+
+
+async def _capture_pyramid(image_id: str):
+    """Build a capture's pyramid once per file version; returns its cache directory and layout."""
+    source = CAPTURE_DIR / image_id
+    if image_id.startswith(".") or not source.is_file():
+        raise HTTPException(status_code=404, detail="Unknown image")
+    stat = source.stat()
+    version = f"{stat.st_mtime_ns:x}-{stat.st_size:x}-{TILE_SIZE}"
+    cache_dir = TILE_CACHE / image_id / version
+    info_path = cache_dir / "info.json"
+    if not info_path.exists():
+        if (TILE_CACHE / image_id).exists() and image_id not in _tile_jobs:
+            # The capture was overwritten; drop pyramids of its older versions.
+            await run_in_threadpool(shutil.rmtree, TILE_CACHE / image_id, True)
+        await _in_tile_pool(image_id, build_image_pyramid, str(source), str(cache_dir), TILE_SIZE, TILE_QUALITY)
+    with open(info_path, "r", encoding="utf-8") as f:
+        return cache_dir, version, PyramidInfo(**json.load(f))
+
+
+def _tile_response(request: Request, path: Path, etag: str, cache_control: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+
+def _claim_lens() -> None:
+    global _lens_busy
+    if _lens_busy:
+        raise HTTPException(status_code=409, detail="The lens is busy with another focus operation")
+    _lens_busy = True
+
+
+def _release_lens() -> None:
+    global _lens_busy
+    _lens_busy = False
+
+
+def _background(coro) -> None:
+    # Keep a reference so the task is not garbage collected mid-run.
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _frame_grabber(grabber: "_FrameGrabber"):
+    """Return a blocking callable yielding the pixels of the next published frame."""
+
+    def grab():
+        seq, _, _ = grabber.latest()
+        latest = grabber.wait_next(seq)
+        if latest is None:
+            raise HTTPException(status_code=500, detail="Failed to capture image")
+        return _frame_pixels(latest[1])
+
+    return grab
+
+
+def _lens_mover(dnx64):
+    """Return a blocking callable moving the lens through the command worker."""
+
+    def move(position: int) -> None:
+        dnx64.scheduler.call("SetLensPos", DNX64_DEVICE_INDEX, position, timeout=DNX64_CALL_TIMEOUT)
+
+    return move
+
+
+async def _run_autofocus(payload: dict, limits=None, claim: bool = True):
+    dnx64 = _init_dnx64()
+    if dnx64 is None:
+        raise HTTPException(status_code=503, detail="DNX64 is not available")
+    features = await _get_features(dnx64)
+    if features is not None and not features.edof:
+        raise HTTPException(status_code=409, detail="Device has no EDOF lens")
+    grab = _frame_grabber(_init_grabber())
+    if limits is None:
+        limits = await dnx64.GetLensPosLimits(DNX64_DEVICE_INDEX)
+    roi = payload.get("roi")
+    move = _lens_mover(dnx64)
+    kwargs = {
+        "roi": tuple(int(v) for v in roi) if roi else None,
+        "settle": max(0.0, float(payload.get("settle_ms", AF_SETTLE_MS)) / 1000.0),
+    }
+    for key in ("scale", "coarse_steps", "tolerance"):
+        if key in payload:
+            kwargs[key] = payload[key]
+    if not claim:
+        # The caller already holds the lens.
+        return await run_in_threadpool(autofocus, move, grab, limits, **kwargs)
+    _claim_lens()
+    try:
+        return await run_in_threadpool(autofocus, move, grab, limits, **kwargs)
+    finally:
+        _release_lens()
+
+
+async def _autofocus_quietly() -> None:
+    try:
+        await _run_autofocus({})
+    except Exception:
+        pass
+
+
 @app.get("/health")
 async def health():
     camera_open = _camera is not None and _camera.isOpened()
-    return {"status": "ok", "camera_open": camera_open}
+    return {
+        "status": "ok",
+        "camera_open": camera_open,
+        "mjpeg_clients": [client.as_dict() for client in _stream_clients.values()],
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/dnx64/trace")
+async def dnx64_trace(recent: int = 0):
+    _init_dnx64()
+    tracer = getattr(_dnx64_device, "tracer", None)
+    if tracer is None or not DNX64_TRACE:
+        raise HTTPException(status_code=404, detail="DNX64 tracing is disabled (set DNX64_TRACE)")
+    tracer.flush()
+    return {"methods": tracer.stats(), "recent": tracer.recent()[-recent:] if recent > 0 else []}
+
+
+@app.get("/devices")
+async def devices(refresh: bool = False):
+    registry = _init_device_registry()
+    if registry is None:
+        return {"devices": [], "refreshed_at": None}
+    if refresh or registry.refreshed_at is None:
+        await run_in_threadpool(registry.refresh)
+    return {
+        "devices": [device._asdict() for device in registry.devices()],
+        "refreshed_at": registry.refreshed_at,
+    }
 
 
 @app.get("/stream")
@@ -134,7 +930,7 @@ async def stream(request: Request):
 
 @app.post("/start")
 async def start_camera():
-    _init_camera()
+    _init_grabber()
     return {"status": "started"}
 
 
@@ -145,23 +941,27 @@ async def stop_camera():
 
 
 @app.get("/params")
-async def get_params():
-    cam = _init_camera()
-    dnx64 = _init_dnx64()
+async def get_params(device: Optional[int] = None):
+    index = DNX64_DEVICE_INDEX if device is None else device
+    dnx64 = _dnx64_for(device)
+    # The OpenCV camera belongs to the primary device; for the others the
+    # guarded cam calls below simply fail and only DNX64 values are used.
+    cam = _init_camera() if index == DNX64_DEVICE_INDEX else None
 
-    exposure_range = _get_video_proc_range(dnx64, DNX64_EXPOSURE_INDEX) or {
+    exposure_range = (await _get_video_proc_range(dnx64, DNX64_EXPOSURE_INDEX)) or {
         "min": DEFAULT_EXPOSURE_MIN,
         "max": DEFAULT_EXPOSURE_MAX,
         "step": 1,
         "default": DEFAULT_EXPOSURE_MIN,
     }
-    gain_range = _get_video_proc_range(dnx64, DNX64_GAIN_INDEX) or {
+    gain_range = (await _get_video_proc_range(dnx64, DNX64_GAIN_INDEX)) or {
         "min": DEFAULT_GAIN_MIN,
         "max": DEFAULT_GAIN_MAX,
         "step": 1,
         "default": DEFAULT_GAIN_MIN,
     }
-    focus_range = _get_focus_range(dnx64) or {
+    features = await _get_features(dnx64, index)
+    focus_range = (await _get_focus_range(dnx64, index)) or {
         "min": DEFAULT_FOCUS_MIN,
         "max": DEFAULT_FOCUS_MAX,
         "step": 1,
@@ -176,7 +976,7 @@ async def get_params():
         pass
     if dnx64 is not None:
         try:
-            auto_exposure = dnx64.GetAutoExposure(DNX64_DEVICE_INDEX)
+            auto_exposure = await dnx64.GetAutoExposure(index)
         except Exception:
             pass
 
@@ -194,7 +994,7 @@ async def get_params():
         pass
     if dnx64 is not None:
         try:
-            exposure = dnx64.GetExposureValue(DNX64_DEVICE_INDEX)
+            exposure = await dnx64.GetExposureValue(index)
         except Exception:
             pass
 
@@ -203,7 +1003,7 @@ async def get_params():
     except Exception:
         pass
 
-    return {
+    params = {
         "exposure": exposure,
         "gain": gain,
         "focus": focus,
@@ -211,53 +1011,481 @@ async def get_params():
         "autoFocus": True if auto_focus == 1 else False if auto_focus == 0 else None,
         "ranges": {"exposure": exposure_range, "gain": gain_range, "focus": focus_range},
     }
+    if features is not None:
+        params["features"] = features.describe()
+        if not features.edof:
+            # No EDOF lens: there is no focus control to offer.
+            for key in ("focus", "autoFocus"):
+                del params[key]
+            del params["ranges"]["focus"]
+    return params
 
 
 @app.get("/mjpeg")
-async def mjpeg():
-    cam = _init_camera()
+async def mjpeg(quality: int = JPEG_QUALITY, fps: Optional[float] = None):
+    grabber = _init_grabber()
+    cache = _init_jpeg_cache()
+    target_fps = min(float(fps), FRAME_FPS) if fps and fps > 0 else float(FRAME_FPS)
+    interval = 1.0 / max(target_fps, 1e-3)
+    # Frames a client at `target_fps` skips by design between two deliveries.
+    expected_skip = max(0, round(FRAME_FPS / target_fps) - 1)
 
-    def generate():
-        while True:
-            ok, frame = cam.read()
-            if not ok:
-                time.sleep(0.2)
-                continue
-            payload = _encode_frame(frame)
-            yield (
-                b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n" + payload + b"\r\n"
-            )
-            time.sleep(max(0.0, 1.0 / max(FRAME_FPS, 1)))
+    async def generate():
+        client = _StreamClient(next(_stream_client_ids), target_fps)
+        _stream_clients[client.client_id] = client
+        last_seq = 0
+        next_due = 0.0
+        try:
+            while grabber.running:
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # Always take the newest frame; anything older is skipped.
+                latest = await grabber.wait_next_async(last_seq)
+                if latest is None:
+                    continue
+                seq, frame, _ = latest
+                if last_seq:
+                    dropped = max(0, seq - last_seq - 1 - expected_skip)
+                    if dropped:
+                        client.dropped += dropped
+                        _frames_dropped.inc(dropped)
+                last_seq = seq
+                next_due = time.monotonic() + interval
+                payload = await run_in_threadpool(cache.get, seq, frame, quality)
+                start = time.perf_counter()
+                yield (
+                    b"--frame\r\n"
+                    b"Content-Type: image/jpeg\r\n\r\n" + payload + b"\r\n"
+                )
+                # The generator resumes once the frame has been handed to the client.
+                _send_seconds.observe(time.perf_counter() - start)
+                _stream_lag_frames.observe(grabber.latest()[0] - seq)
+                _frames_sent.inc()
+                client.sent += 1
+        finally:
+            _stream_clients.pop(client.client_id, None)
 
     return StreamingResponse(generate(), media_type="multipart/x-mixed-replace; boundary=frame")
 
 
 @app.post("/capture")
 async def capture(payload: dict):
-    cam = _init_camera()
-    ok, frame = cam.read()
-    if not ok:
+    grabber = _init_grabber()
+    at = payload.get("at")
+    offset_ms = payload.get("offset_ms")
+    if at is not None or offset_ms is not None:
+        if HISTORY_SECONDS <= 0:
+            raise HTTPException(status_code=409, detail="Frame history is off; set CAMERA_HISTORY_SECONDS")
+        target = float(at) if at is not None else time.time() + float(offset_ms) / 1000.0
+        latest = grabber.frame_at(target)
+        if latest is None:
+            raise HTTPException(status_code=409, detail="No buffered frames available")
+    else:
+        seq, _, _ = grabber.latest()
+        latest = await grabber.wait_next_async(seq)
+    if latest is None:
         raise HTTPException(status_code=500, detail="Failed to capture image")
+    seq, frame, frame_time = latest
 
     timestamp = time.strftime("%Y%m%d_%H%M%S")
     tool_id = payload.get("tool_id", 0)
     waypoint_index = payload.get("waypoint_index", 0)
+    quality = int(payload.get("quality", JPEG_QUALITY))
     filename = f"capture_t{tool_id}_w{waypoint_index}_{timestamp}.jpg"
-    path = CAPTURE_DIR / filename
-    cv2.imwrite(str(path), frame)
+    future, job = _init_capture_writer().submit(filename, seq, frame, quality)
+    mosaic = _queue_mosaic(payload, filename, frame)
+    if payload.get("wait"):
+        try:
+            await asyncio.shield(asyncio.wrap_future(future))
+        except Exception:
+            pass
 
     return {
-        "image_id": filename,
-        "image_url": f"/captures/{filename}",
+        **_capture_status(filename, job),
+        "frame_time": frame_time,
+        "mosaic": mosaic,
         "captured_at_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
     }
 
 
-@app.post("/params")
-async def set_params(payload: dict):
-    cam = _init_camera()
+@app.post("/capture/burst")
+async def capture_burst(payload: dict):
+    count = int(payload.get("count", 10))
+    if not 1 <= count <= BURST_MAX_FRAMES:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {BURST_MAX_FRAMES}")
+    interval = max(0.0, float(payload.get("interval_ms", 0)) / 1000.0)
+    tool_id = payload.get("tool_id", 0)
+    waypoint_index = payload.get("waypoint_index", 0)
+    quality = int(payload.get("quality", JPEG_QUALITY))
+    grabber = _init_grabber()
+
+    global _burst_ring, _burst_ring_busy
+    # The shared ring stays claimed until its batch has been written; a burst
+    # that overlaps a pending write gets a ring of its own instead.
+    if _burst_ring_busy:
+        ring = _FrameRing(count)
+    else:
+        if _burst_ring is None or _burst_ring.capacity < count:
+            _burst_ring = _FrameRing(count)
+        ring = _burst_ring
+        _burst_ring_busy = True
+    ring.clear()
+
+    def release_ring(_=None) -> None:
+        global _burst_ring_busy
+        if ring is _burst_ring:
+            _burst_ring_busy = False
+
+    try:
+        last_seq, _, _ = grabber.latest()
+        next_due = 0.0
+        while len(ring) < count:
+            delay = next_due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            latest = await grabber.wait_next_async(last_seq)
+            if latest is None:
+                raise HTTPException(status_code=500, detail="Failed to capture image")
+            last_seq, frame, frame_time = latest
+            ring.push(last_seq, frame, frame_time)
+            next_due = time.monotonic() + interval
+
+        entries = ring.entries()
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        items = [
+            (f"capture_t{tool_id}_w{waypoint_index}_{timestamp}_f{i:03d}.jpg", seq, frame)
+            for i, (seq, frame, _) in enumerate(entries)
+        ]
+        future, jobs = _init_capture_writer().submit_batch(items, quality)
+    except BaseException:
+        release_ring()
+        raise
+    future.add_done_callback(release_ring)
+
+    if payload.get("wait"):
+        try:
+            await asyncio.shield(asyncio.wrap_future(future))
+        except Exception:
+            pass
+
+    return {
+        "frames": [
+            {**_capture_status(image_id, job), "frame_time": frame_time}
+            for (image_id, _, _), job, (_, _, frame_time) in zip(items, jobs, entries)
+        ],
+        "duration_ms": round((entries[-1][2] - entries[0][2]) * 1000.0, 1),
+        "captured_at_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+async def _sweep_edof(dnx64, grabber, limits, steps: int, settle: float):
+    start = time.perf_counter()
+    stacker = await run_in_threadpool(
+        focus_stack, _lens_mover(dnx64), _frame_grabber(grabber), lens_positions(limits, steps), settle
+    )
+    return stacker, time.perf_counter() - start
+
+
+@app.post("/capture/edof")
+async def capture_edof(payload: dict):
+    steps = int(payload.get("steps", EDOF_STEPS))
+    if not 2 <= steps <= EDOF_MAX_STEPS:
+        raise HTTPException(status_code=400, detail=f"steps must be between 2 and {EDOF_MAX_STEPS}")
+    settle = max(0.0, float(payload.get("settle_ms", EDOF_SETTLE_MS)) / 1000.0)
+    tool_id = payload.get("tool_id", 0)
+    waypoint_index = payload.get("waypoint_index", 0)
+    quality = int(payload.get("quality", JPEG_QUALITY))
     dnx64 = _init_dnx64()
+    if dnx64 is None:
+        raise HTTPException(status_code=503, detail="DNX64 is not available")
+    features = await _get_features(dnx64)
+    if features is not None and not features.edof:
+        raise HTTPException(status_code=409, detail="Device has no EDOF lens")
+    grabber = _init_grabber()
+    limits = await dnx64.GetLensPosLimits(DNX64_DEVICE_INDEX)
+
+    _claim_lens()
+    try:
+        stacker, elapsed = await _sweep_edof(dnx64, grabber, limits, steps, settle)
+    finally:
+        _release_lens()
+
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    filename = f"capture_t{tool_id}_w{waypoint_index}_{timestamp}_edof.jpg"
+    items = [(filename, -1, stacker.fused)]
+    if payload.get("depth"):
+        items.append((filename.replace("_edof.jpg", "_edof_depth.jpg"), -1, stacker.depth_map()))
+    future, jobs = _init_capture_writer().submit_batch(items, quality)
+    mosaic = _queue_mosaic(payload, filename, stacker.fused)
+    if payload.get("wait"):
+        try:
+            await asyncio.shield(asyncio.wrap_future(future))
+        except Exception:
+            pass
+
+    return {
+        **_capture_status(filename, jobs[0]),
+        "mosaic": mosaic,
+        "depth": _capture_status(items[1][0], jobs[1]) if len(items) > 1 else None,
+        "positions": stacker.positions,
+        "sharpest_position": stacker.sharpest_position,
+        "duration_ms": round(elapsed * 1000.0, 1),
+        "captured_at_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+@app.post("/focus/auto")
+async def focus_auto(payload: Optional[dict] = None):
+    result = await _run_autofocus(payload or {})
+    return {
+        "position": result.position,
+        "score": result.score,
+        "moves": result.moves,
+        "frames": result.frames,
+        "elapsed_ms": round(result.elapsed * 1000.0, 1),
+        "samples": result.samples,
+    }
+
+
+async def _focus_waypoint(tool_id, waypoint_index, verify: bool, roi) -> dict:
+    dnx64 = _init_dnx64()
+    if dnx64 is None:
+        raise HTTPException(status_code=503, detail="DNX64 is not available")
+    store = _init_waypoint_store()
+    features = await _get_features(dnx64)
+    edof = features is None or features.edof
+    amr = await dnx64.GetAMR(DNX64_DEVICE_INDEX) if features is not None and features.amr else None
+    entry = store.get(tool_id, waypoint_index)
+    if entry and amr is not None and entry.get("amr") is not None and abs(entry["amr"] - amr) > WAYPOINT_AMR_TOLERANCE:
+        # The magnification changed: nothing stored for this waypoint applies.
+        entry = None
+    roi = tuple(int(v) for v in roi) if roi else None
+    settle = AF_SETTLE_MS / 1000.0
+
+    start = time.perf_counter()
+    source, position, score, result, calls = "none", None, None, None, []
+    moves = frames = 0
+    _claim_lens()
+    try:
+        if entry is not None:
+            profile = {}
+            if edof and entry.get("lens_position") is not None:
+                profile["lens_position"] = entry["lens_position"]
+            if entry.get("auto_exposure") == 0 and entry.get("exposure") is not None:
+                profile.update(auto_exposure=0, exposure=entry["exposure"])
+            elif entry.get("auto_exposure") == 1:
+                profile["auto_exposure"] = 1
+            calls = await dnx64.call("apply_settings", DNX64_DEVICE_INDEX, profile, settle, coalesce=False)
+            source, position = "store", profile.get("lens_position")
+            moves += any(method == "SetLensPos" for method, _ in calls)
+            if verify and position is not None:
+                grab = _frame_grabber(_init_grabber())
+                score = await run_in_threadpool(lambda: sharpness(grab(), roi))
+                frames += 1
+                if score < entry.get("sharpness", 0.0) * WAYPOINT_MIN_SHARPNESS:
+                    upper, lower = await dnx64.GetLensPosLimits(DNX64_DEVICE_INDEX)
+                    low, high = min(upper, lower), max(upper, lower)
+                    limits = (min(high, position + WAYPOINT_SEARCH_RANGE), max(low, position - WAYPOINT_SEARCH_RANGE))
+                    result = await _run_autofocus({"roi": roi, "coarse_steps": 3}, limits=limits, claim=False)
+                    source = "local"
+        elif verify and edof:
+            result = await _run_autofocus({"roi": roi}, claim=False)
+            source = "search"
+    finally:
+        _release_lens()
+    if result is not None:
+        position, score = result.position, result.score
+        moves += result.moves
+        frames += result.frames
+
+    if verify:
+        # Remember what worked, for the next pass over this waypoint.
+        values = {"amr": amr}
+        if result is not None:
+            # Only a search sets the reference sharpness; a stored position
+            # that merely passed the check must not lower the bar it is held to.
+            values.update(lens_position=position, sharpness=score)
+        try:
+            values["auto_exposure"] = await dnx64.GetAutoExposure(DNX64_DEVICE_INDEX)
+            values["exposure"] = await dnx64.GetExposureValue(DNX64_DEVICE_INDEX)
+        except Exception:
+            pass
+        store.put(tool_id, waypoint_index, **values)
+
+    return {
+        "tool_id": tool_id,
+        "waypoint_index": waypoint_index,
+        "source": source,
+        "lens_position": position,
+        "sharpness": score,
+        "calls": [[method, list(args)] for method, args in calls],
+        "moves": moves,
+        "frames": frames,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000.0, 1),
+    }
+
+
+@app.post("/waypoint")
+async def announce_waypoint(payload: dict):
+    return await _focus_waypoint(
+        payload.get("tool_id", 0),
+        payload.get("waypoint_index", 0),
+        bool(payload.get("verify", True)),
+        payload.get("roi"),
+    )
+
+
+@app.get("/waypoint/{tool_id}/{waypoint_index}")
+async def get_waypoint(tool_id: str, waypoint_index: str):
+    entry = _init_waypoint_store().get(tool_id, waypoint_index)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown waypoint")
+    return entry
+
+
+@app.delete("/waypoint/{tool_id}/{waypoint_index}")
+async def forget_waypoint(tool_id: str, waypoint_index: str):
+    if not _init_waypoint_store().forget(tool_id, waypoint_index):
+        raise HTTPException(status_code=404, detail="Unknown waypoint")
+    return {"status": "ok"}
+
+
+@app.get("/mosaic/{tool_id}")
+async def get_mosaic(tool_id: str, placements: int = 20):
+    mosaic = _init_mosaic(tool_id)
+    bounds = mosaic.bounds
+    return {
+        "tool_id": tool_id,
+        "images": len(mosaic.placements),
+        "bounds": dict(zip(("x", "y", "width", "height"), bounds)) if bounds else None,
+        "placements": [p._asdict() for p in mosaic.placements[-max(0, placements) :]] if placements > 0 else [],
+        "preview_url": f"/mosaic/{tool_id}/preview.jpg",
+    }
+
+
+@app.get("/mosaic/{tool_id}/preview.jpg")
+async def mosaic_preview(tool_id: str, max_side: int = 2048, quality: int = JPEG_QUALITY):
+    mosaic = _init_mosaic(tool_id)
+    image = await run_in_threadpool(mosaic.render, max(16, max_side))
+    if image is None:
+        raise HTTPException(status_code=404, detail="Mosaic is empty")
+    return Response(_encode_frame(image, quality), media_type="image/jpeg")
+
+
+@app.delete("/mosaic/{tool_id}")
+async def reset_mosaic(tool_id: str):
+    global _tile_pool
+    mosaic = _init_mosaic(tool_id)
+    _mosaics.pop(str(tool_id), None)
+    # Tile workers keep the mosaic's tiles mapped, and mapped files cannot be
+    # deleted on Windows; retire the pool once its running jobs are done.
+    pool, _tile_pool = _tile_pool, None
+    if pool is not None:
+        await run_in_threadpool(pool.shutdown, True)
+
+    def remove() -> None:
+        mosaic.close()
+        for path in (mosaic.directory, TILE_CACHE / f"{MOSAIC_TILE_PREFIX}{tool_id}"):
+            if path.exists():
+                shutil.rmtree(path)
+
+    # Run behind any captures still queued for this mosaic.
+    try:
+        if _mosaic_executor is not None:
+            await asyncio.wrap_future(_mosaic_executor.submit(remove))
+        else:
+            await run_in_threadpool(remove)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Could not delete mosaic: {e}")
+    return {"status": "ok"}
+
+
+@app.get("/tiles/{image_id}/info.json")
+async def tile_info(image_id: str):
+    mosaic = _tile_mosaic(image_id)
+    if mosaic is not None:
+        _, info = mosaic_info(mosaic.bounds, TILE_SIZE)
+    else:
+        _, _, info = await _capture_pyramid(image_id)
+    return {
+        **info._asdict(),
+        "min_zoom": 0,
+        "format": "jpg",
+        "tile_url": f"/tiles/{image_id}/{{z}}/{{x}}/{{y}}.jpg",
+    }
+
+
+@app.get("/tiles/{image_id}/{z}/{x}/{y}.jpg")
+async def tile(request: Request, image_id: str, z: int, x: int, y: int):
+    mosaic = _tile_mosaic(image_id)
+    if mosaic is None:
+        cache_dir, version, info = await _capture_pyramid(image_id)
+        if not info.contains(z, x, y):
+            raise HTTPException(status_code=404, detail="Tile out of range")
+        etag = f'"{image_id}-{version}-{z}-{x}-{y}"'
+        return _tile_response(request, cache_dir / str(z) / f"{x}_{y}.jpg", etag, f"public, max-age={TILE_MAX_AGE}")
+
+    origin, info = mosaic_info(mosaic.bounds, TILE_SIZE)
+    if not info.contains(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    cache_dir = TILE_CACHE / image_id
+    version = mosaic_tile_version(mosaic.placements, origin, info, z, x, y)
+    path = cache_dir / mosaic_layout_key(origin, info) / str(z) / f"{x}_{y}_v{version}.jpg"
+    if not path.exists():
+        rendered = await _in_tile_pool(
+            f"{image_id}/{z}/{x}/{y}", render_mosaic_tile, str(mosaic.directory), str(cache_dir), z, x, y, TILE_SIZE, TILE_QUALITY
+        )
+        if rendered is None:
+            raise HTTPException(status_code=404, detail="Tile out of range")
+        path = Path(rendered)
+    # The worker may have seen a newer mosaic; the file name carries the version it drew.
+    etag = f'"{image_id}-{path.parent.parent.name}-{z}-{x}-{path.stem}"'
+    return _tile_response(request, path, etag, "no-cache")
+
+
+@app.get("/capture/{image_id}")
+async def capture_status(image_id: str, wait: bool = False, timeout: float = 10.0):
+    job = _init_capture_writer().job(image_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown capture")
+    if wait and job["status"] == "pending":
+        try:
+            # Shield so a timed-out poll does not cancel the write itself.
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job["future"])), timeout)
+        except Exception:
+            pass
+    return _capture_status(image_id, job)
+
+
+@app.get("/profiles")
+async def list_profiles():
+    profiles = _load_profiles()
+    return {"profiles": {name: settings_dict(profile) for name, profile in profiles.items()}}
+
+
+@app.post("/profiles/{name}")
+async def apply_profile(name: str, device: Optional[int] = None):
+    profile = _load_profiles().get(name)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile {name}")
+    index = DNX64_DEVICE_INDEX if device is None else device
+    dnx64 = _dnx64_for(device)
+    if dnx64 is None:
+        raise HTTPException(status_code=503, detail="DNX64 is not available")
+    # One queued command: unchanged values are skipped and the device is
+    # paced once after the last write.
+    calls = await dnx64.call("apply_settings", index, profile, coalesce=False)
+    return {"status": "ok", "profile": name, "calls": [[method, list(args)] for method, args in calls]}
+
+
+@app.post("/params")
+async def set_params(payload: dict, device: Optional[int] = None):
+    index = DNX64_DEVICE_INDEX if device is None else device
+    cam = _init_camera() if index == DNX64_DEVICE_INDEX else None
+    # DNX64 writes are queued without waiting; repeated slider updates
+    # coalesce on the command worker.
+    dnx64 = _dnx64_for(device)
 
     exposure = payload.get("exposure")
     gain = payload.get("gain")
@@ -272,7 +1500,7 @@ async def set_params(payload: dict):
             pass
         if dnx64 is not None:
             try:
-                dnx64.SetAutoExposure(DNX64_DEVICE_INDEX, 1 if auto_exposure else 0)
+                dnx64.scheduler.submit("SetAutoExposure", index, 1 if auto_exposure else 0)
             except Exception:
                 pass
 
@@ -283,7 +1511,7 @@ async def set_params(payload: dict):
             pass
         if dnx64 is not None:
             try:
-                dnx64.SetExposureValue(DNX64_DEVICE_INDEX, int(exposure))
+                dnx64.scheduler.submit("SetExposureValue", index, int(exposure))
             except Exception:
                 pass
 
@@ -298,6 +1526,9 @@ async def set_params(payload: dict):
             cam.set(cv2.CAP_PROP_AUTOFOCUS, 1 if auto_focus else 0)
         except Exception:
             pass
+        if auto_focus and dnx64 is not None and index == DNX64_DEVICE_INDEX:
+            # EDOF lenses ignore CAP_PROP_AUTOFOCUS; focus once in software.
+            _background(_autofocus_quietly())
 
     if focus is not None and (auto_focus is False or auto_focus is None):
         try:
@@ -306,7 +1537,7 @@ async def set_params(payload: dict):
             pass
         if dnx64 is not None:
             try:
-                dnx64.SetLensPos(DNX64_DEVICE_INDEX, int(focus))
+                dnx64.scheduler.submit("SetLensPos", index, int(focus))
             except Exception:
                 pass
 
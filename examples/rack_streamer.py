@@ -0,0 +1,109 @@
+import importlib
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from frame_sources import open_source
+
+# Global variables
+TILE_WIDTH, TILE_HEIGHT = 640, 480
+CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS = 1280, 960, 30
+DNX64_PATH = "C:\\Program Files\\DNX64\\DNX64.dll"
+
+# DNX64 device index -> frame source of the same microscope, see `frame_sources.open_source`.
+# DNX64 and OpenCV both follow the DirectShow enumeration order, so the indexes usually match.
+# Use "synthetic" sources and DNX64_PATH = "simulator?devices=2" to run without microscopes.
+DEVICES = {0: "usb:0", 1: "usb:1"}
+
+
+class Grabber:
+    """Read one microscope's frames on its own thread; frame capture never touches the DLL."""
+
+    def __init__(self, source: str) -> None:
+        self.camera = open_source(source, CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS)
+        self.frame = None
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            ret, frame = self.camera.read()
+            if ret:
+                self.frame = frame
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.camera.release()
+
+
+def print_amr(lanes):
+    # Queue every device's query first, so they run back to back on the command worker.
+    amr_lanes = {index: lane for index, lane in lanes.items() if lane.call("features", index).amr}
+    futures = {index: lane.submit("GetAMR", index) for index, lane in amr_lanes.items()}
+    for index in lanes:
+        if index in futures:
+            print(f"Device {index}: {round(futures[index].result(), 1)}x")
+        else:
+            print(f"Device {index}: no AMR")
+
+
+def toggle_leds(lanes, state):
+    for index, lane in lanes.items():
+        lane.submit("SetLEDState", index, state)
+    return 0 if state else 1
+
+
+def tile(frames):
+    tiles = []
+    for frame in frames:
+        if frame is None:
+            tiles.append(np.zeros((TILE_HEIGHT, TILE_WIDTH, 3), np.uint8))
+        else:
+            tiles.append(cv2.resize(frame, (TILE_WIDTH, TILE_HEIGHT)))
+    return cv2.hconcat(tiles)
+
+
+def start_rack(manager):
+    lanes = {index: manager.lane(index) for index in DEVICES}
+    grabbers = {index: Grabber(source) for index, source in DEVICES.items()}
+    led_state = 0
+
+    print("Press 'a' for AMR of every device, 'l' to toggle all LEDs, ESC to exit.")
+    while True:
+        cv2.imshow("Dino-Lite rack", tile(grabber.frame for grabber in grabbers.values()))
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord("a"):
+            print_amr(lanes)
+        if key == ord("l"):
+            led_state = toggle_leds(lanes, led_state)
+        if key == 27:
+            break
+        time.sleep(1 / CAMERA_FPS)
+
+    for grabber in grabbers.values():
+        grabber.stop()
+    cv2.destroyAllWindows()
+
+
+def run_rack():
+    try:
+        DNX64 = getattr(importlib.import_module("DNX64"), "DNX64")
+        DeviceManager = getattr(importlib.import_module("DNX64"), "DeviceManager")
+    except ImportError as err:
+        print("Error: ", err)
+
+    # One manager owns the DLL: it selects each device before its calls and
+    # serves the devices in turn, while frames are grabbed in parallel.
+    microscope = DNX64(DNX64_PATH)
+    microscope.Init()
+    manager = DeviceManager(microscope)
+    start_rack(manager)
+    manager.close()
+
+
+# if __name__ == "__main__":
+#     run_rack()
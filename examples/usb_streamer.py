@@ -1,10 +1,11 @@
 import importlib
 import math
-import threading
 import time
 
 import cv2
 
+from frame_sources import open_source
+
 # Global variables
 WINDOW_WIDTH, WINDOW_HEIGHT = 1280, 960
 CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS = 1280, 960, 30
@@ -14,9 +15,10 @@ DEVICE_INDEX = 0
 # Camera index, please change it if you have more than one camera,
 # i.e. webcam, connected to your PC until CAM_INDEX is been set to first Dino-Lite product.
 CAM_INDEX = 0
-# Buffer time for Dino-Lite to return value
-QUERY_TIME = 0.05
-# Buffer time to allow Dino-Lite to process command
+# Frame source, see `frame_sources.open_source`. Use "synthetic" or "replay:<path>" to run without a microscope.
+CAMERA_SOURCE = f"usb:{CAM_INDEX}"
+# Buffer time to allow Dino-Lite to process command.
+# Enforced by the CommandScheduler only when the next command follows too soon.
 COMMAND_TIME = 0.25
 
 
@@ -26,16 +28,6 @@ def clear_line(n=1):
         print("", end=LINE_CLEAR)
 
 
-def threaded(func):
-    """Wrapper to run a function in a separate thread with @threaded decorator"""
-
-    def wrapper(*args, **kwargs):
-        thread = threading.Thread(target=func, args=args, kwargs=kwargs)
-        thread.start()
-
-    return wrapper
-
-
 def custom_microtouch_function():
     """Executes when MicroTouch press event got detected"""
 
@@ -45,82 +37,61 @@ def custom_microtouch_function():
 
 
 def print_amr(microscope):
-    config = microscope.GetConfig(DEVICE_INDEX)
-    if (config & 0x40) == 0x40:
-        amr = microscope.GetAMR(DEVICE_INDEX)
+    # Features are decoded from GetConfig once, then served from memory.
+    if microscope.call("features", DEVICE_INDEX).amr:
+        amr = microscope.call("GetAMR", DEVICE_INDEX)
         amr = round(amr, 1)
         clear_line(1)
         print(f"{amr}x", end="\r")
-        time.sleep(QUERY_TIME)
     else:
         clear_line(1)
         print("It does not belong to the AMR serie.", end="\r")
 
 
 def print_config(microscope):
-    config = microscope.GetConfig(DEVICE_INDEX)
+    features = microscope.call("features", DEVICE_INDEX)
     clear_line(1)
     print("Config value =", end="")
-    print("0x{:X}".format(config), end="")
-    if (config & 0x80) == 0x80:
-        print(", EDOF", end="")
-    if (config & 0x40) == 0x40:
-        print(", AMR", end="")
-    if (config & 0x20) == 0x20:
-        print(", eFLC", end="")
-    if (config & 0x10) == 0x10:
-        print(", Aim Point Laser", end="")
-    if (config & 0xC) == 0x4:
-        print(", 2 segments LED", end="")
-    if (config & 0xC) == 0x8:
-        print(", 3 segments LED", end="")
-    if (config & 0x2) == 0x2:
-        print(", FLC", end="")
-    if (config & 0x1) == 0x1:
-        print(", AXI")
+    print("0x{:X}".format(features.config), end="")
+    for name in features.describe():
+        print(f", {name}", end="")
     print("", end="\r")
-    time.sleep(QUERY_TIME)
 
 
 def set_index(microscope):
-    microscope.SetVideoDeviceIndex(0)
-    time.sleep(COMMAND_TIME)
+    microscope.submit("SetVideoDeviceIndex", 0)
 
 
 def print_fov_mm(microscope):
-    amr = microscope.GetAMR(DEVICE_INDEX)
-    fov = microscope.FOVx(DEVICE_INDEX, amr)
+    # Without AMR the magnification is unknown; 0 falls back to the 50x FOV below.
+    amr = microscope.call("GetAMR", DEVICE_INDEX) if microscope.call("features", DEVICE_INDEX).amr else 0.0
+    fov = microscope.call("FOVx", DEVICE_INDEX, amr)
     amr = round(amr, 1)
     fov = round(fov / 1000, 2)
     if fov == math.inf:
-        fov = round(microscope.FOVx(DEVICE_INDEX, 50.0) / 1000.0, 2)
+        fov = round(microscope.call("FOVx", DEVICE_INDEX, 50.0) / 1000.0, 2)
         clear_line(1)
         print("50x fov: ", fov, "mm", end="\r")
     else:
         clear_line(1)
         print(f"{amr}x fov: ", fov, "mm", end="\r")
-    time.sleep(QUERY_TIME)
 
 
 def print_deviceid(microscope):
     clear_line(1)
-    print(microscope.GetDeviceId(0), end="\r")
-    time.sleep(QUERY_TIME)
+    print(microscope.call("GetDeviceId", 0), end="\r")
 
 
-@threaded
 def flash_leds(microscope):
-    microscope.SetLEDState(0, 0)
-    time.sleep(COMMAND_TIME)
-    microscope.SetLEDState(0, 1)
-    time.sleep(COMMAND_TIME)
+    # Queued without coalescing so both the off and the on reach the LEDs.
+    microscope.submit("SetLEDState", 0, 0, coalesce=False)
+    microscope.submit("SetLEDState", 0, 1, coalesce=False)
     clear_line(1)
     print("flash_leds", end="\r")
 
 
 def led_off(microscope):
-    microscope.SetLEDState(0, 0)
-    time.sleep(COMMAND_TIME)
+    microscope.submit("SetLEDState", 0, 0)
     clear_line(1)
     print("led off", end="\r")
 
@@ -157,19 +128,14 @@ def stop_recording(video_writer):
 
 def initialize_camera():
     """
-    Setup OpenCV camera parameters and return the camera object.
+    Open the frame source configured by CAMERA_SOURCE and return the camera object.
     Change CAM_INDEX to Dino-Lite camera index, which is based on the order of the camera connected to your PC.
     Read the full doc of `cv2.VideoCapture()` at
     https://docs.opencv.org/4.5.2/d8/dfe/classcv_1_1VideoCapture.html#aabce0d83aa0da9af802455e8cf5fd181 &
     https://docs.opencv.org/3.4/dd/d43/tutorial_py_video_display.html
     """
 
-    camera = cv2.VideoCapture(CAM_INDEX, cv2.CAP_DSHOW)
-    camera.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
-    camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter.fourcc("m", "j", "p", "g"))
-    camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter.fourcc("M", "J", "P", "G"))
-    camera.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-    camera.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+    camera = open_source(CAMERA_SOURCE, CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS)
     return camera
 
 
@@ -181,14 +147,11 @@ def process_frame(frame):
 
 def init_microscope(microscope):
     # Set index of video device. Call before Init().
-    microscope.SetVideoDeviceIndex(DEVICE_INDEX)
-    time.sleep(0.1)
+    microscope.submit("SetVideoDeviceIndex", DEVICE_INDEX)
     # Enabled MicroTouch Event
-    microscope.EnableMicroTouch(True)
-    time.sleep(0.1)
+    microscope.submit("EnableMicroTouch", True)
     # Function to execute when MicroTouch event detected
-    microscope.SetEventCallback(custom_microtouch_function)
-    time.sleep(0.1)
+    microscope.submit("SetEventCallback", custom_microtouch_function)
 
     return microscope
 
@@ -246,27 +209,23 @@ def config_keymaps(microscope, frame):
 
     # Press '6' to let EFCL Quadrant 1 to flash
     if key == ord("6"):
-        microscope.SetEFLC(DEVICE_INDEX, 1, 32)
-        time.sleep(0.1)
-        microscope.SetEFLC(DEVICE_INDEX, 1, 31)
+        microscope.submit("SetEFLC", DEVICE_INDEX, 1, 32, coalesce=False)
+        microscope.submit("SetEFLC", DEVICE_INDEX, 1, 31, coalesce=False)
 
     # Press '7' to let EFCL Quadrant 2 to flash
     if key == ord("7"):
-        microscope.SetEFLC(DEVICE_INDEX, 2, 32)
-        time.sleep(0.1)
-        microscope.SetEFLC(DEVICE_INDEX, 2, 15)
+        microscope.submit("SetEFLC", DEVICE_INDEX, 2, 32, coalesce=False)
+        microscope.submit("SetEFLC", DEVICE_INDEX, 2, 15, coalesce=False)
 
     # Press '8' to let EFCL Quadrant 3 to flash
     if key == ord("8"):
-        microscope.SetEFLC(DEVICE_INDEX, 3, 32)
-        time.sleep(0.1)
-        microscope.SetEFLC(DEVICE_INDEX, 3, 15)
+        microscope.submit("SetEFLC", DEVICE_INDEX, 3, 32, coalesce=False)
+        microscope.submit("SetEFLC", DEVICE_INDEX, 3, 15, coalesce=False)
 
     # Press '9' to let EFCL Quadrant 4 to flash
     if key == ord("9"):
-        microscope.SetEFLC(DEVICE_INDEX, 4, 32)
-        time.sleep(0.1)
-        microscope.SetEFLC(DEVICE_INDEX, 4, 31)
+        microscope.submit("SetEFLC", DEVICE_INDEX, 4, 32, coalesce=False)
+        microscope.submit("SetEFLC", DEVICE_INDEX, 4, 31, coalesce=False)
 
     return key
 
@@ -325,12 +284,14 @@ def start_camera(microscope):
 def run_usb():
     try:
         DNX64 = getattr(importlib.import_module("DNX64"), "DNX64")
+        CommandScheduler = getattr(importlib.import_module("DNX64"), "CommandScheduler")
     except ImportError as err:
         print("Error: ", err)
 
-    # Initialize microscope
-    micro_scope = DNX64(DNX64_PATH)
+    # Initialize microscope. All DLL calls go through one command worker.
+    micro_scope = CommandScheduler(DNX64(DNX64_PATH), command_time=COMMAND_TIME)
     start_camera(micro_scope)
+    micro_scope.close()
 
 
 # if __name__ == "__main__":
@@ -1,31 +1,23 @@
 import importlib
 import math
-import threading
 import time
 
 import cv2
 
+from frame_sources import open_source
+
 # Global variables
 WINDOW_WIDTH, WINDOW_HEIGHT = 1280, 960
 DNX64_PATH = "C:\\Program Files\\DNX64\\DNX64.dll"
 DINO_STREAMER = "http://10.10.10.254:8080/?action=stream"
+# Frame source, see `frame_sources.open_source`. Use "synthetic" or "replay:<path>" to run without a streamer.
+CAMERA_SOURCE = f"url:{DINO_STREAMER}"
 DEVICE_INDEX = 90  # Use 90 for WF-10 / WF-20 Dino-Lite Streamer
-# Buffer time for Dino-Lite to return value
-QUERY_TIME = 0.05
-# Buffer time to allow Dino-Lite to process command
+# Buffer time to allow Dino-Lite to process command.
+# Enforced by the CommandScheduler only when the next command follows too soon.
 COMMAND_TIME = 0.25
 
 
-def threaded(func):
-    """Wrapper to run a function in a separate thread with @threaded decorator"""
-
-    def wrapper(*args, **kwargs):
-        thread = threading.Thread(target=func, args=args, kwargs=kwargs)
-        thread.start()
-
-    return wrapper
-
-
 def custom_microtouch_function():
     """Executes when MicroTouch press detected"""
 
@@ -33,20 +25,20 @@ def custom_microtouch_function():
 
 
 def get_resolutions(microscope):
-    print(microscope.GetWiFiVideoCaps())
+    print(microscope.call("GetWiFiVideoCaps"))
 
 
 def change_resolution(microscope):
-    microscope.SetWiFiVideoRes(1280, 1024)
+    microscope.submit("SetWiFiVideoRes", 1280, 1024)
 
 
-@threaded
 def capture_image_wifi(microscope):
     counter = [0]
     counter[0] += 1
     filename = f"streamer_image_{counter[0]}.jpg"
-    microscope.GetWiFiImage(filename)
-    print(f"Saved image from Wi-Fi Streamer to: {filename}")
+    # Runs on the command worker; the preview loop keeps going meanwhile.
+    future = microscope.submit("GetWiFiImage", filename)
+    future.add_done_callback(lambda _: print(f"Saved image from Wi-Fi Streamer to: {filename}"))
 
 
 def capture_image(frame):
@@ -59,9 +51,9 @@ def capture_image(frame):
 
 
 def initialize_camera():
-    """Setup OpenCV camera parameters and return the camera object."""
+    """Open the frame source configured by CAMERA_SOURCE and return the camera object."""
 
-    camera = cv2.VideoCapture(DINO_STREAMER, cv2.CAP_FFMPEG)
+    camera = open_source(CAMERA_SOURCE)
     return camera
 
 
@@ -115,13 +107,15 @@ def start_camera(microscope):
 def run_wifi():
     try:
         DNX64 = getattr(importlib.import_module("DNX64"), "DNX64")
+        CommandScheduler = getattr(importlib.import_module("DNX64"), "CommandScheduler")
     except ImportError as err:
         print("Error: ", err)
 
-    # Initialize microscope
-    micro_scope = DNX64(DNX64_PATH)
-    micro_scope.SetVideoDeviceIndex(DEVICE_INDEX)
+    # Initialize microscope. All DLL calls go through one command worker.
+    micro_scope = CommandScheduler(DNX64(DNX64_PATH), command_time=COMMAND_TIME)
+    micro_scope.submit("SetVideoDeviceIndex", DEVICE_INDEX)
     start_camera(micro_scope)
+    micro_scope.close()
 
 
 # if __name__ == "__main__":
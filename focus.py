@@ -0,0 +1,275 @@
+import math
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Side, in pixels, of the window the per-pixel focus measure is averaged over.
+FOCUS_WINDOW = 9
+# Seconds to let the EDOF lens settle after a move before grabbing a frame.
+LENS_SETTLE = 0.1
+# Autofocus: downscale factor for scoring, coarse sweep size and the lens
+# position interval at which the fine search stops.
+AF_SCALE = 0.25
+AF_COARSE_STEPS = 5
+AF_TOLERANCE = 8
+
+
+def focus_measure(image: np.ndarray, window: int = FOCUS_WINDOW) -> np.ndarray:
+    """
+    Per-pixel focus measure: local energy of the Laplacian.
+
+    Parameters:
+        image (np.ndarray): BGR or grayscale frame.
+        window (int): Side of the averaging window in pixels.
+
+    Returns:
+        np.ndarray: float32 map of the same height and width; larger is sharper.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    laplacian = cv2.Laplacian(gray, cv2.CV_32F, ksize=3)
+    np.square(laplacian, out=laplacian)
+    return cv2.boxFilter(laplacian, -1, (window, window))
+
+
+def lens_positions(limits: Tuple[int, int], steps: int) -> List[int]:
+    """
+    Evenly spaced lens positions covering `GetLensPosLimits`, ordered low to high.
+
+    Parameters:
+        limits (Tuple[int, int]): (upper, lower) as returned by `GetLensPosLimits`.
+        steps (int): Number of positions.
+    """
+    low, high = sorted(limits)
+    return sorted(set(int(round(p)) for p in np.linspace(low, high, max(1, steps))))
+
+
+class FocusStacker:
+    """
+    Fuse a focus sweep into one all-in-focus image, one frame at a time.
+
+    Only the running result is kept: the fused image, the best focus measure
+    seen at each pixel and the index of the frame it came from. Memory is
+    therefore the same for 5 frames as for 500; frames can be dropped as soon
+    as `add` returns.
+
+    Parameters:
+        window (int): Focus measure window, see `focus_measure`.
+    """
+
+    def __init__(self, window: int = FOCUS_WINDOW) -> None:
+        self.window = window
+        self.fused: Optional[np.ndarray] = None
+        self.best: Optional[np.ndarray] = None
+        self.index: Optional[np.ndarray] = None
+        # Lens position and mean focus measure of every frame added.
+        self.positions: List[Optional[int]] = []
+        self.scores: List[float] = []
+
+    def add(self, image: np.ndarray, position: Optional[int] = None) -> float:
+        """
+        Merge one frame of the sweep into the result.
+
+        Parameters:
+            image (np.ndarray): BGR or grayscale frame, same size as the others.
+            position (Optional[int]): Lens position the frame was taken at.
+
+        Returns:
+            float: Mean focus measure of the frame.
+        """
+        measure = focus_measure(image, self.window)
+        layer = len(self.positions)
+        if self.fused is None:
+            self.fused = image.copy()
+            self.best = measure
+            self.index = np.zeros(measure.shape, np.uint16)
+        else:
+            sharper = measure > self.best
+            np.copyto(self.fused, image, where=sharper[..., None] if image.ndim == 3 else sharper)
+            np.maximum(self.best, measure, out=self.best)
+            self.index[sharper] = layer
+        score = float(measure.mean())
+        self.positions.append(position)
+        self.scores.append(score)
+        return score
+
+    @property
+    def sharpest_position(self) -> Optional[int]:
+        """Lens position of the frame that was sharpest overall."""
+        if not self.scores:
+            return None
+        return self.positions[int(np.argmax(self.scores))]
+
+    def depth_map(self) -> Optional[np.ndarray]:
+        """The frame index of every pixel scaled to 0-255, as a grayscale image."""
+        if self.index is None:
+            return None
+        scale = 255.0 / max(1, len(self.positions) - 1)
+        return (self.index * scale).astype(np.uint8)
+
+
+def focus_stack(
+    move: Callable[[int], None],
+    grab: Callable[[], np.ndarray],
+    positions: Sequence[int],
+    settle: float = LENS_SETTLE,
+    window: int = FOCUS_WINDOW,
+    park: bool = True,
+) -> FocusStacker:
+    """
+    Sweep the lens and fuse the frames into an all-in-focus image.
+
+    Each frame is fused on a worker thread while the lens moves to the next
+    position, and at most one frame waits to be fused at any time.
+
+    Parameters:
+        move (Callable[[int], None]): Moves the lens, e.g.
+            `lambda p: microscope.SetLensPos(0, p)`.
+        grab (Callable[[], np.ndarray]): Returns a frame taken after the call.
+        positions (Sequence[int]): Lens positions, e.g. from `lens_positions`.
+        settle (float): Seconds to wait after each move before grabbing.
+        window (int): Focus measure window.
+        park (bool): Leave the lens at the sharpest frame's position, also
+            when the sweep fails part way.
+
+    Returns:
+        FocusStacker: `fused` is the result, `index` the per-pixel frame index.
+
+    Example:
+        stack = focus_stack(
+            lambda p: microscope.SetLensPos(0, p),
+            lambda: camera.read()[1],
+            lens_positions(microscope.GetLensPosLimits(0), 12),
+        )
+        cv2.imwrite("edof.jpg", stack.fused)
+    """
+    stacker = FocusStacker(window)
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="focus-stack") as executor:
+            fusing: Optional[Future] = None
+            for position in positions:
+                move(position)
+                time.sleep(settle)
+                frame = grab()
+                if fusing is not None:
+                    fusing.result()
+                fusing = executor.submit(stacker.add, frame, position)
+            if fusing is not None:
+                fusing.result()
+    except BaseException:
+        if park and stacker.sharpest_position is not None:
+            try:
+                move(stacker.sharpest_position)
+            except Exception:
+                pass
+        raise
+    if park and stacker.sharpest_position is not None:
+        move(stacker.sharpest_position)
+    return stacker
+
+
+def sharpness(image: np.ndarray, roi: Optional[Tuple[int, int, int, int]] = None, scale: float = AF_SCALE) -> float:
+    """
+    Variance of the Laplacian over a downscaled region of interest.
+
+    Parameters:
+        image (np.ndarray): BGR or grayscale frame.
+        roi (Optional[Tuple[int, int, int, int]]): (x, y, width, height) in
+            full-resolution pixels; defaults to the centre half of the frame.
+        scale (float): Downscale factor applied to the ROI before scoring.
+    """
+    height, width = image.shape[:2]
+    if roi is None:
+        roi = (width // 4, height // 4, width // 2, height // 2)
+    x, y, w, h = roi
+    region = image[max(0, y) : y + h, max(0, x) : x + w]
+    if region.ndim == 3:
+        region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    if scale != 1.0:
+        region = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(region, cv2.CV_32F).var())
+
+
+class AutofocusResult(NamedTuple):
+    """Outcome of `autofocus`."""
+
+    position: int
+    score: float
+    moves: int
+    frames: int
+    elapsed: float
+    samples: List[Tuple[int, float]]
+
+
+def autofocus(
+    move: Callable[[int], None],
+    grab: Callable[[], np.ndarray],
+    limits: Tuple[int, int],
+    roi: Optional[Tuple[int, int, int, int]] = None,
+    scale: float = AF_SCALE,
+    coarse_steps: int = AF_COARSE_STEPS,
+    tolerance: int = AF_TOLERANCE,
+    settle: float = LENS_SETTLE,
+) -> AutofocusResult:
+    """
+    Find the sharpest lens position with as few moves and frames as possible.
+
+    A coarse sweep of `coarse_steps` positions across `limits` brackets the
+    peak, then a golden-section search narrows the bracket around the best
+    coarse position until it is `tolerance` wide. Every position is scored
+    once (`sharpness` on a downscaled ROI); the lens ends on the best one.
+
+    Parameters:
+        move (Callable[[int], None]): Moves the lens.
+        grab (Callable[[], np.ndarray]): Returns a frame taken after the call.
+        limits (Tuple[int, int]): (upper, lower) from `GetLensPosLimits`.
+        roi, scale: See `sharpness`.
+        coarse_steps (int): Positions in the coarse sweep.
+        tolerance (int): Lens position interval at which the search stops.
+        settle (float): Seconds to wait after each move before grabbing.
+
+    Returns:
+        AutofocusResult: Best position and score, lens moves, frames scored,
+        elapsed seconds and every (position, score) sampled.
+    """
+    start = time.perf_counter()
+    low, high = sorted(limits)
+    scores = {}
+    counts = {"moves": 0, "frames": 0}
+    current = [None]
+
+    def score(position: float) -> float:
+        position = int(round(min(max(position, low), high)))
+        if position not in scores:
+            move(position)
+            current[0] = position
+            counts["moves"] += 1
+            time.sleep(settle)
+            scores[position] = sharpness(grab(), roi, scale)
+            counts["frames"] += 1
+        return scores[position]
+
+    coarse = lens_positions(limits, coarse_steps)
+    for position in coarse:
+        score(position)
+    best = max(coarse, key=scores.get)
+    step = (high - low) / max(1, len(coarse) - 1)
+    a, b = max(low, best - step), min(high, best + step)
+
+    ratio = (math.sqrt(5) - 1) / 2
+    while b - a > tolerance:
+        c, d = b - ratio * (b - a), a + ratio * (b - a)
+        if score(c) >= score(d):
+            b = d
+        else:
+            a = c
+
+    best = max(scores, key=scores.get)
+    if current[0] != best:
+        move(best)
+        counts["moves"] += 1
+    return AutofocusResult(
+        best, scores[best], counts["moves"], counts["frames"], time.perf_counter() - start, sorted(scores.items())
+    )
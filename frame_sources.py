@@ -0,0 +1,254 @@
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+
+
+class FrameSource:
+    """
+    Base class for anything the capture code can read frames from.
+
+    The interface mirrors the parts of `cv2.VideoCapture` used in this
+    project (`read`, `isOpened`, `release`, `get`, `set`) so a source can be
+    dropped in wherever a camera object was used. Sources that are not backed
+    by OpenCV keep properties in a plain dict.
+    """
+
+    def __init__(self) -> None:
+        self._props: dict = {}
+        self._opened = True
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        raise NotImplementedError
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def release(self) -> None:
+        self._opened = False
+
+    def get(self, prop_id: int) -> float:
+        return float(self._props.get(prop_id, 0))
+
+    def set(self, prop_id: int, value: float) -> bool:
+        self._props[prop_id] = value
+        return True
+
+
+class CaptureSource(FrameSource):
+    """Frame source backed by a `cv2.VideoCapture`."""
+
+    def __init__(self, capture: cv2.VideoCapture) -> None:
+        super().__init__()
+        self.capture = capture
+
+    def read(self):
+        return self.capture.read()
+
+    def isOpened(self) -> bool:
+        return self.capture.isOpened()
+
+    def release(self) -> None:
+        self.capture.release()
+
+    def get(self, prop_id: int) -> float:
+        return self.capture.get(prop_id)
+
+    def set(self, prop_id: int, value: float) -> bool:
+        return self.capture.set(prop_id, value)
+
+
+class UsbSource(CaptureSource):
+    """
+    Dino-Lite (or any UVC camera) attached over USB.
+
+    Parameters:
+        index (int): OpenCV camera index.
+        width (int), height (int), fps (int): Requested capture format.
+        passthrough (bool): Return the camera's MJPG buffers instead of BGR.
+        backend (int): OpenCV capture backend. Default: DirectShow.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        width: int = 1280,
+        height: int = 960,
+        fps: int = 30,
+        passthrough: bool = False,
+        backend: int = cv2.CAP_DSHOW,
+    ) -> None:
+        capture = cv2.VideoCapture(index, backend)
+        capture.set(cv2.CAP_PROP_FPS, fps)
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter.fourcc("M", "J", "P", "G"))
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if passthrough:
+            # Hand back the camera's compressed MJPG buffers instead of decoded BGR.
+            capture.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        super().__init__(capture)
+
+
+class UrlSource(CaptureSource):
+    """Network stream such as the Dino-Lite Wi-Fi streamer's MJPEG URL."""
+
+    def __init__(self, url: str) -> None:
+        super().__init__(cv2.VideoCapture(url, cv2.CAP_FFMPEG))
+
+
+class _PacedSource(FrameSource):
+    """Source that produces frames itself and holds them to a target rate."""
+
+    def __init__(self, fps: float, passthrough: bool = False) -> None:
+        super().__init__()
+        self.fps = fps
+        self.passthrough = passthrough
+        self._next_due = 0.0
+        self._props[cv2.CAP_PROP_FPS] = fps
+
+    def _pace(self) -> None:
+        if self.fps <= 0:
+            return
+        now = time.monotonic()
+        if self._next_due > now:
+            time.sleep(self._next_due - now)
+            now = self._next_due
+        self._next_due = max(self._next_due + 1.0 / self.fps, now)
+
+    def _output(self, frame: np.ndarray):
+        if not self.passthrough:
+            return True, frame
+        ok, encoded = cv2.imencode(".jpg", frame)
+        return ok, encoded.reshape(1, -1) if ok else None
+
+
+class ReplaySource(_PacedSource):
+    """
+    Replay a video file or a folder of images at a fixed rate.
+
+    Parameters:
+        path (str): Video file, or directory of images played in name order.
+        fps (float): Playback rate; 0 plays as fast as frames can be read.
+        loop (bool): Restart from the beginning when the end is reached.
+    """
+
+    def __init__(self, path: str, fps: float = 30, loop: bool = True, passthrough: bool = False) -> None:
+        super().__init__(fps, passthrough)
+        self.path = Path(path)
+        self.loop = loop
+        self._capture: Optional[cv2.VideoCapture] = None
+        self._images: list = []
+        self._position = 0
+        if self.path.is_dir():
+            self._images = sorted(p for p in self.path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+            self._opened = bool(self._images)
+        else:
+            self._capture = cv2.VideoCapture(str(self.path))
+            self._opened = self._capture.isOpened()
+
+    def _next_frame(self) -> Optional[np.ndarray]:
+        if self._capture is not None:
+            ok, frame = self._capture.read()
+            if not ok and self.loop:
+                self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self._capture.read()
+            return frame if ok else None
+        if self._position >= len(self._images):
+            if not self.loop:
+                return None
+            self._position = 0
+        frame = cv2.imread(str(self._images[self._position]), cv2.IMREAD_COLOR)
+        self._position += 1
+        return frame
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        self._pace()
+        frame = self._next_frame()
+        if frame is None:
+            return False, None
+        return self._output(frame)
+
+    def release(self) -> None:
+        if self._capture is not None:
+            self._capture.release()
+        super().release()
+
+
+class SyntheticSource(_PacedSource):
+    """
+    Generate a moving test pattern with NumPy, no hardware required.
+
+    The pattern is a checkerboard over a colour gradient that scrolls by a
+    few pixels per frame, with the frame number drawn in the corner, so
+    consecutive frames differ and encode like real content.
+    """
+
+    def __init__(self, width: int = 1280, height: int = 960, fps: float = 30, passthrough: bool = False) -> None:
+        super().__init__(fps, passthrough)
+        self.width = width
+        self.height = height
+        self._count = 0
+        self._props[cv2.CAP_PROP_FRAME_WIDTH] = width
+        self._props[cv2.CAP_PROP_FRAME_HEIGHT] = height
+        y, x = np.mgrid[0:height, 0:width]
+        checker = (((x // 32) + (y // 32)) % 2).astype(np.uint8) * 96
+        base = np.empty((height, width, 3), dtype=np.uint8)
+        base[..., 0] = (x * 255 // max(width - 1, 1)).astype(np.uint8)
+        base[..., 1] = (y * 255 // max(height - 1, 1)).astype(np.uint8)
+        base[..., 2] = 128
+        self._base = cv2.add(base, cv2.merge([checker, checker, checker]))
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        self._pace()
+        self._count += 1
+        frame = np.roll(self._base, (self._count * 4) % self.width, axis=1)
+        cv2.putText(frame, str(self._count), (16, 48), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+        return self._output(frame)
+
+
+def open_source(
+    spec: str,
+    width: int = 1280,
+    height: int = 960,
+    fps: int = 30,
+    passthrough: bool = False,
+) -> FrameSource:
+    """
+    Open a frame source from a configuration string.
+
+    Accepted forms:
+        `usb:<index>` (or a bare index), `url:<stream url>` (or any
+        `http(s)://`/`rtsp://` URL), `replay:<video file or image folder>`
+        and `synthetic`.
+
+    Parameters:
+        spec (str): Source description as above.
+        width (int), height (int), fps (int): Requested format.
+        passthrough (bool): Prefer compressed MJPG frames where supported.
+
+    Returns:
+        FrameSource: The opened source; check `isOpened()` before use.
+    """
+    kind, _, arg = spec.partition(":")
+    if spec.isdigit():
+        kind, arg = "usb", spec
+    elif spec.startswith(("http://", "https://", "rtsp://")):
+        kind, arg = "url", spec
+
+    if kind == "usb":
+        return UsbSource(int(arg or 0), width, height, fps, passthrough)
+    if kind == "url":
+        return UrlSource(arg)
+    if kind == "replay":
+        return ReplaySource(arg, fps, passthrough=passthrough)
+    if kind == "synthetic":
+        return SyntheticSource(width, height, fps, passthrough)
+    raise ValueError(f"Unknown frame source: {spec!r}")
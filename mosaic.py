@@ -0,0 +1,298 @@
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Side of one canvas tile in pixels.
+TILE_SIZE = 1024
+# Open tiles kept mapped; older ones are flushed and unmapped.
+OPEN_TILES = 64
+# Registration: downscale factor, smallest overlap worth registering, the
+# largest correction trusted, and the phase correlation peak below which the
+# grid guess is kept.
+REGISTER_SCALE = 0.25
+MIN_OVERLAP = 0.1
+MAX_SHIFT = 200
+MIN_RESPONSE = 0.05
+
+
+class Placement(NamedTuple):
+    """Where one image landed in the mosaic."""
+
+    image_id: str
+    x: int
+    y: int
+    width: int
+    height: int
+    dx: int
+    dy: int
+    response: float
+
+
+class TiledCanvas:
+    """
+    An unbounded BGR canvas stored as memory-mapped tiles on disk.
+
+    Tiles are `.npy` files created only where something is drawn, so the
+    canvas can grow to gigapixel size (in any direction, coordinates may be
+    negative) while RAM holds just the `open_tiles` most recently used ones.
+    Each tile has a float32 weight plane next to it; `blend` keeps a running
+    weighted average, which feathers overlapping images together.
+
+    Parameters:
+        directory (str | Path): Where the tiles are kept.
+        tile_size (int): Side of a tile in pixels.
+        open_tiles (int): Tiles kept mapped at once.
+        readonly (bool): Map tiles read-only, e.g. in a process that only serves them.
+    """
+
+    def __init__(
+        self, directory, tile_size: int = TILE_SIZE, open_tiles: int = OPEN_TILES, readonly: bool = False
+    ) -> None:
+        self.directory = Path(directory)
+        self.tile_size = tile_size
+        self.open_tiles = open_tiles
+        self.readonly = readonly
+        self._tiles: "OrderedDict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+
+    def _paths(self, tx: int, ty: int) -> Tuple[Path, Path]:
+        return self.directory / f"tile_{tx}_{ty}.npy", self.directory / f"weight_{tx}_{ty}.npy"
+
+    def _tile(self, tx: int, ty: int, create: bool):
+        key = (tx, ty)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+        pixels_path, weight_path = self._paths(tx, ty)
+        mode = "r" if self.readonly else "r+"
+        if pixels_path.exists():
+            tile = (
+                np.lib.format.open_memmap(pixels_path, mode=mode),
+                np.lib.format.open_memmap(weight_path, mode=mode),
+            )
+        elif create and not self.readonly:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            size = self.tile_size
+            tile = (
+                np.lib.format.open_memmap(pixels_path, mode="w+", dtype=np.uint8, shape=(size, size, 3)),
+                np.lib.format.open_memmap(weight_path, mode="w+", dtype=np.float32, shape=(size, size)),
+            )
+        else:
+            return None
+        self._tiles[key] = tile
+        while len(self._tiles) > self.open_tiles:
+            _, (pixels, weight) = self._tiles.popitem(last=False)
+            if not self.readonly:
+                pixels.flush()
+                weight.flush()
+        return tile
+
+    def _spans(self, x: int, y: int, width: int, height: int):
+        # (tile x, tile y, slice in tile, slice in region) for every tile the region touches.
+        size = self.tile_size
+        for ty in range(y // size, (y + height - 1) // size + 1):
+            for tx in range(x // size, (x + width - 1) // size + 1):
+                x0, y0 = max(x, tx * size), max(y, ty * size)
+                x1, y1 = min(x + width, (tx + 1) * size), min(y + height, (ty + 1) * size)
+                tile_slice = (slice(y0 - ty * size, y1 - ty * size), slice(x0 - tx * size, x1 - tx * size))
+                region_slice = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+                yield tx, ty, tile_slice, region_slice
+
+    def blend(self, image: np.ndarray, weight: np.ndarray, x: int, y: int) -> None:
+        """Blend `image` (BGR) into the canvas at (x, y) using per-pixel `weight`."""
+        height, width = image.shape[:2]
+        for tx, ty, tile_slice, region_slice in self._spans(x, y, width, height):
+            pixels, weights = self._tile(tx, ty, create=True)
+            old_w = weights[tile_slice]
+            new_w = weight[region_slice]
+            total = old_w + new_w
+            mix = np.divide(new_w, total, out=np.zeros_like(total), where=total > 0)[..., None]
+            old = pixels[tile_slice].astype(np.float32)
+            pixels[tile_slice] = (old + (image[region_slice] - old) * mix).round().astype(np.uint8)
+            weights[tile_slice] = total
+
+    def read(self, x: int, y: int, width: int, height: int, with_weight: bool = False):
+        """
+        Read a region; pixels never drawn are black (weight 0).
+
+        Returns:
+            np.ndarray, or (pixels, weight) if `with_weight`.
+        """
+        out = np.zeros((height, width, 3), np.uint8)
+        out_w = np.zeros((height, width), np.float32) if with_weight else None
+        for tx, ty, tile_slice, region_slice in self._spans(x, y, width, height):
+            tile = self._tile(tx, ty, create=False)
+            if tile is None:
+                continue
+            out[region_slice] = tile[0][tile_slice]
+            if with_weight:
+                out_w[region_slice] = tile[1][tile_slice]
+        return (out, out_w) if with_weight else out
+
+    def flush(self) -> None:
+        if self.readonly:
+            return
+        for pixels, weight in self._tiles.values():
+            pixels.flush()
+            weight.flush()
+
+    def close(self) -> None:
+        """Flush and unmap every open tile; the canvas reopens them on demand."""
+        self.flush()
+        self._tiles.clear()
+
+
+class Mosaic:
+    """
+    Stitch captures into a `TiledCanvas` one at a time.
+
+    Each image starts at a guessed position (from the waypoint grid) and is
+    registered against what the canvas already holds there: both are
+    downscaled and masked to their common area, and `cv2.phaseCorrelate`
+    gives the correction. Corrections larger than `max_shift` or with a weak
+    peak are ignored, so a textureless area falls back to the grid. The
+    placements are saved to `mosaic.json` next to the tiles, so a mosaic
+    survives restarts and keeps growing.
+
+    Parameters:
+        directory (str | Path): Directory of this mosaic.
+        scale (float): Downscale factor for registration.
+        max_shift (int): Largest correction accepted, in full-resolution pixels.
+        readonly (bool): Open the canvas read-only; `add` is then unavailable.
+    """
+
+    def __init__(
+        self, directory, scale: float = REGISTER_SCALE, max_shift: int = MAX_SHIFT, readonly: bool = False
+    ) -> None:
+        self.directory = Path(directory)
+        self.canvas = TiledCanvas(self.directory / "tiles", readonly=readonly)
+        self.scale = scale
+        self.max_shift = max_shift
+        self.placements: List[Placement] = []
+        self._weights: Dict[Tuple[int, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+        index = self.directory / "mosaic.json"
+        if index.exists():
+            with open(index, "r", encoding="utf-8") as f:
+                self.placements = [Placement(*p) for p in json.load(f)["placements"]]
+
+    def _feather(self, height: int, width: int) -> np.ndarray:
+        # Weight ramps up from the borders, so seams fade instead of cutting.
+        weight = self._weights.get((height, width))
+        if weight is None:
+            ys = np.minimum(np.arange(height), np.arange(height)[::-1]) + 1
+            xs = np.minimum(np.arange(width), np.arange(width)[::-1]) + 1
+            weight = np.minimum.outer(ys, xs).astype(np.float32)
+            weight /= weight.max()
+            self._weights[(height, width)] = weight
+        return weight
+
+    def _register(self, image: np.ndarray, x: int, y: int) -> Tuple[int, int, float]:
+        height, width = image.shape[:2]
+        reference, coverage = self.canvas.read(x, y, width, height, with_weight=True)
+        mask = coverage > 0
+        if mask.mean() < MIN_OVERLAP:
+            return 0, 0, 0.0
+        size = (max(8, int(width * self.scale)), max(8, int(height * self.scale)))
+        small_mask = cv2.resize(mask.astype(np.float32), size, interpolation=cv2.INTER_AREA)
+        window = cv2.createHanningWindow(size, cv2.CV_32F) * small_mask
+
+        def prepare(pixels: np.ndarray) -> np.ndarray:
+            gray = cv2.cvtColor(cv2.resize(pixels, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+            gray = gray.astype(np.float32)
+            return (gray - gray[small_mask > 0.5].mean()) * small_mask
+
+        (dx, dy), response = cv2.phaseCorrelate(prepare(reference), prepare(image), window)
+        dx, dy = int(round(dx / self.scale)), int(round(dy / self.scale))
+        if response < MIN_RESPONSE or max(abs(dx), abs(dy)) > self.max_shift:
+            return 0, 0, float(response)
+        # phaseCorrelate reports how far the image content moved relative to
+        # the reference; move the image back by that much.
+        return -dx, -dy, float(response)
+
+    def add(self, image_id: str, image: np.ndarray, guess: Tuple[int, int]) -> Placement:
+        """
+        Register `image` near `guess` (x, y of its top-left corner) and blend it in.
+
+        Returns:
+            Placement: Final position, the correction applied and the correlation peak.
+        """
+        with self._lock:
+            x, y = guess
+            dx, dy, response = self._register(image, x, y)
+            height, width = image.shape[:2]
+            self.canvas.blend(image, self._feather(height, width), x + dx, y + dy)
+            placement = Placement(image_id, x + dx, y + dy, width, height, dx, dy, response)
+            self.placements.append(placement)
+            self.canvas.flush()
+            self._save()
+            return placement
+
+    @property
+    def bounds(self) -> Optional[Tuple[int, int, int, int]]:
+        """(x, y, width, height) covering every placed image, or None if empty."""
+        if not self.placements:
+            return None
+        x0 = min(p.x for p in self.placements)
+        y0 = min(p.y for p in self.placements)
+        x1 = max(p.x + p.width for p in self.placements)
+        y1 = max(p.y + p.height for p in self.placements)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def render(self, max_side: int = 2048) -> Optional[np.ndarray]:
+        """Downscaled image of the whole mosaic, read one tile row at a time."""
+        bounds = self.bounds
+        if bounds is None:
+            return None
+        x, y, width, height = bounds
+        scale = min(1.0, max_side / max(width, height))
+        out = np.zeros((max(1, int(height * scale)), max(1, int(width * scale)), 3), np.uint8)
+        band = self.canvas.tile_size
+        with self._lock:
+            for top in range(0, height, band):
+                rows = min(band, height - top)
+                strip = self.canvas.read(x, y + top, width, rows)
+                out_top, out_bottom = int(top * scale), int((top + rows) * scale)
+                if out_bottom > out_top:
+                    out[out_top:out_bottom] = cv2.resize(strip, (out.shape[1], out_bottom - out_top), interpolation=cv2.INTER_AREA)
+        return out
+
+    def read(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """Read a region of the canvas in full resolution."""
+        with self._lock:
+            return self.canvas.read(x, y, width, height)
+
+    def close(self) -> None:
+        with self._lock:
+            self.canvas.close()
+
+    def _save(self) -> None:
+        index = self.directory / "mosaic.json"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = index.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"placements": [list(p) for p in self.placements]}, f)
+        tmp.replace(index)
+
+
+def grid_position(
+    waypoint_index: int, columns: int, step: Tuple[int, int], serpentine: bool = True
+) -> Tuple[int, int]:
+    """
+    Expected top-left corner of a waypoint's capture on a raster grid.
+
+    Parameters:
+        waypoint_index (int): Index along the robot's path.
+        columns (int): Waypoints per row.
+        step (Tuple[int, int]): Pixels between neighbouring waypoints in x and y.
+        serpentine (bool): Every other row runs right to left.
+    """
+    row, column = divmod(int(waypoint_index), max(1, columns))
+    if serpentine and row % 2:
+        column = columns - 1 - column
+    return column * step[0], row * step[1]
@@ -0,0 +1,213 @@
+"""
+Benchmark camera_service.py under load.
+
+Runs the FastAPI app in-process against a synthetic or replayed frame source
+and reports:
+- delivered FPS per `/mjpeg` client as the number of clients grows,
+- `/capture` and `GET /params` latency (p50/p99),
+- CPU time per frame for grab, encode and the rest of the send path.
+
+Stream clients run in separate processes so the CPU time measured here is
+the service's own. Results are printed and optionally written as JSON.
+
+Usage:
+    python ./scripts/benchmark_camera_service.py --clients 1 2 4 8 --output bench.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(samples_s):
+    samples_ms = [s * 1000.0 for s in samples_s]
+    return {
+        "count": len(samples_ms),
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+        "max_ms": round(max(samples_ms), 3),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def mjpeg_client(args):
+    """Read `/mjpeg` for `duration` seconds and return the number of frames."""
+    port, query, duration = args
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(f"GET /mjpeg?{query} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+    frames = 0
+    tail = b""
+    start = time.monotonic()
+    # Skip the frame(s) already in flight when the clock starts.
+    warmup_until = start + 0.5
+    while time.monotonic() - start < duration + 0.5:
+        chunk = sock.recv(1 << 16)
+        if not chunk:
+            break
+        data = tail + chunk
+        if time.monotonic() >= warmup_until:
+            frames += data.count(b"--frame")
+        tail = data[-8:]
+    sock.close()
+    return frames
+
+
+def request(port, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}",
+        data=body,
+        method=method,
+        headers={"Content-Type": "application/json"},
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(req) as resp:
+        resp.read()
+    return time.perf_counter() - start
+
+
+def time_requests(port, method, path, payload, count):
+    return [request(port, method, path, payload) for _ in range(count)]
+
+
+def cpu_per_frame(service, frames=60):
+    """Measure grab and encode CPU time per frame outside the server."""
+    from frame_sources import open_source
+
+    source = open_source(service.CAMERA_SOURCE, service.FRAME_WIDTH, service.FRAME_HEIGHT, 0)
+    source.read()
+    start = time.process_time()
+    for _ in range(frames):
+        ok, frame = source.read()
+    grab = (time.process_time() - start) / frames
+
+    start = time.process_time()
+    for _ in range(frames):
+        service._encode_frame(frame)
+    encode = (time.process_time() - start) / frames
+    source.release()
+    return {"grab_ms": round(grab * 1000.0, 3), "encode_ms": round(encode * 1000.0, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="synthetic", help="CAMERA_SOURCE for the service (default: synthetic)")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=960)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per client-count step")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per latency measurement")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    capture_dir = tempfile.mkdtemp(prefix="camera_bench_")
+    os.environ["CAMERA_SOURCE"] = args.source
+    os.environ["CAMERA_WIDTH"] = str(args.width)
+    os.environ["CAMERA_HEIGHT"] = str(args.height)
+    os.environ["CAMERA_FPS"] = str(args.fps)
+    os.environ["CAMERA_CAPTURE_DIR"] = capture_dir
+
+    import cv2
+    import fastapi
+    import numpy
+    import uvicorn
+
+    import camera_service
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(camera_service.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    request(port, "POST", "/start", {})
+    time.sleep(1.0)
+
+    results = {
+        "timestamp_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "source": args.source,
+            "width": args.width,
+            "height": args.height,
+            "fps": args.fps,
+            "duration_s": args.duration,
+        },
+        "versions": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "fastapi": fastapi.__version__,
+            "numpy": numpy.__version__,
+        },
+        "mjpeg": [],
+    }
+
+    with multiprocessing.Pool(max(args.clients)) as pool:
+        for count in args.clients:
+            cpu_start = time.process_time()
+            frames = pool.map(mjpeg_client, [(port, "", args.duration)] * count)
+            cpu = time.process_time() - cpu_start
+            fps = [f / args.duration for f in frames]
+            step = {
+                "clients": count,
+                "fps_per_client_mean": round(sum(fps) / len(fps), 2),
+                "fps_per_client_min": round(min(fps), 2),
+                "frames_delivered": sum(frames),
+                "service_cpu_ms_per_frame": round(cpu * 1000.0 / max(sum(frames), 1), 3),
+            }
+            results["mjpeg"].append(step)
+            print(f"mjpeg clients={count} fps/client={step['fps_per_client_mean']} (min {step['fps_per_client_min']})")
+
+    results["capture"] = latency_summary(time_requests(port, "POST", "/capture", {"wait": True}, args.requests))
+    print(f"capture {results['capture']}")
+    results["params"] = latency_summary(time_requests(port, "GET", "/params", None, args.requests))
+    print(f"params {results['params']}")
+
+    results["cpu_per_frame"] = cpu_per_frame(camera_service)
+    # Grab and encode happen once per frame and are shared by all clients;
+    # whatever is left of the per-delivered-frame CPU is the send path.
+    first = results["mjpeg"][0]
+    shared = results["cpu_per_frame"]["grab_ms"] + results["cpu_per_frame"]["encode_ms"]
+    results["cpu_per_frame"]["send_ms"] = round(
+        max(0.0, first["service_cpu_ms_per_frame"] - shared / first["clients"]), 3
+    )
+    print(f"cpu per frame {results['cpu_per_frame']}")
+
+    request(port, "POST", "/stop", {})
+    server.should_exit = True
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
+import os
+import sys
 import time
+from pathlib import Path
 
 import cv2
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
 INDEXES = list(range(0, 6))
+DLL_PATH = os.getenv("DNX64_DLL_PATH", "")
 BACKENDS = [
     ("DSHOW", cv2.CAP_DSHOW),
     ("MSMF", cv2.CAP_MSMF),
@@ -48,10 +56,29 @@ def try_open(index: int, backend_name: str, backend: int, fourcc: str, size):
     }
 
 
+def dino_lite_indexes():
+    """Return OpenCV indices of enumerated DNX64 devices, or None without the DLL."""
+    if not DLL_PATH:
+        return None
+    try:
+        from DNX64 import DNX64, DeviceRegistry
+
+        registry = DeviceRegistry(DNX64(DLL_PATH))
+        devices = registry.refresh()
+    except Exception as e:
+        print(f"DNX64 enumeration unavailable ({e}); probing all indexes.")
+        return None
+    for device in devices:
+        print(f"DNX64 device {device.index}: {device.name} id={device.device_id} opencv_index={device.opencv_index}")
+    return [device.opencv_index for device in devices if device.opencv_index is not None]
+
+
 def main():
     candidates = []
+    # Only probe the indexes the DNX64 SDK reports, when it is available.
+    indexes = dino_lite_indexes() or INDEXES
     print("Scanning cameras...")
-    for index in INDEXES:
+    for index in indexes:
         for backend_name, backend in BACKENDS:
             for fourcc in FOURCCS:
                 for size in RESOLUTIONS:
@@ -0,0 +1,208 @@
+import json
+import math
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from mosaic import Mosaic
+
+# Side of a pyramid tile in pixels and the JPEG quality tiles are stored at.
+TILE_SIZE = 256
+TILE_QUALITY = 85
+
+
+class PyramidInfo(NamedTuple):
+    """
+    Layout of a tile pyramid.
+
+    Zoom 0 fits the whole image in one tile; each level doubles the size up to
+    `max_zoom`, which is full resolution. Edge tiles are cropped to the image
+    instead of padded, as in DeepZoom.
+    """
+
+    width: int
+    height: int
+    tile_size: int
+    max_zoom: int
+
+    @classmethod
+    def for_size(cls, width: int, height: int, tile_size: int = TILE_SIZE) -> "PyramidInfo":
+        max_zoom = max(0, math.ceil(math.log2(max(width, height, 1) / tile_size)))
+        return cls(int(width), int(height), int(tile_size), max_zoom)
+
+    def factor(self, z: int) -> int:
+        """Full-resolution pixels per pixel at zoom `z`."""
+        return 2 ** (self.max_zoom - z)
+
+    def level_size(self, z: int) -> Tuple[int, int]:
+        factor = self.factor(z)
+        return max(1, -(-self.width // factor)), max(1, -(-self.height // factor))
+
+    def tiles(self, z: int) -> Tuple[int, int]:
+        """Tile columns and rows at zoom `z`."""
+        width, height = self.level_size(z)
+        return -(-width // self.tile_size), -(-height // self.tile_size)
+
+    def contains(self, z: int, x: int, y: int) -> bool:
+        if not 0 <= z <= self.max_zoom:
+            return False
+        columns, rows = self.tiles(z)
+        return 0 <= x < columns and 0 <= y < rows
+
+    def region(self, z: int, x: int, y: int) -> Tuple[int, int, int, int]:
+        """(x, y, width, height) a tile covers in full-resolution pixels, clipped to the image."""
+        span = self.tile_size * self.factor(z)
+        left, top = x * span, y * span
+        return left, top, min(span, self.width - left), min(span, self.height - top)
+
+
+def _write_jpeg(path: Path, image: np.ndarray, quality: int) -> None:
+    ok, data = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise RuntimeError(f"Failed to encode {path.name}")
+    # Write a sibling file and swap it in, so readers never see half a tile.
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data.tobytes())
+    os.replace(tmp, path)
+
+
+def build_image_pyramid(source, cache_dir, tile_size: int = TILE_SIZE, quality: int = TILE_QUALITY) -> dict:
+    """
+    Decode an image once and write every tile of its pyramid.
+
+    Tiles go to `cache_dir/{z}/{x}_{y}.jpg`; `info.json` is written last, so
+    its presence means the pyramid is complete. Each level is halved from the
+    one above it rather than resized from the original. Meant to run on a
+    worker process.
+
+    Returns:
+        dict: The `PyramidInfo` fields.
+    """
+    cache_dir = Path(cache_dir)
+    image = cv2.imread(str(source), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Cannot decode {source}")
+    info = PyramidInfo.for_size(image.shape[1], image.shape[0], tile_size)
+    level = image
+    for z in range(info.max_zoom, -1, -1):
+        width, height = info.level_size(z)
+        if level.shape[1] != width or level.shape[0] != height:
+            level = cv2.resize(level, (width, height), interpolation=cv2.INTER_AREA)
+        (cache_dir / str(z)).mkdir(parents=True, exist_ok=True)
+        columns, rows = info.tiles(z)
+        for y in range(rows):
+            for x in range(columns):
+                tile = level[y * tile_size : (y + 1) * tile_size, x * tile_size : (x + 1) * tile_size]
+                _write_jpeg(cache_dir / str(z) / f"{x}_{y}.jpg", tile, quality)
+    with open(cache_dir / "info.json", "w", encoding="utf-8") as f:
+        json.dump(info._asdict(), f)
+    return info._asdict()
+
+
+def mosaic_info(bounds: Tuple[int, int, int, int], tile_size: int = TILE_SIZE) -> Tuple[Tuple[int, int], PyramidInfo]:
+    """Origin of the pyramid in canvas coordinates and its layout for mosaic `bounds`."""
+    x, y, width, height = bounds
+    return (x, y), PyramidInfo.for_size(width, height, tile_size)
+
+
+def mosaic_layout_key(origin: Tuple[int, int], info: PyramidInfo) -> str:
+    """Cache directory name for one mosaic layout; tiles move when any of these change."""
+    return f"{origin[0]}_{origin[1]}_{info.max_zoom}_{info.tile_size}"
+
+
+def mosaic_tile_version(placements: Sequence, origin: Tuple[int, int], info: PyramidInfo, z: int, x: int, y: int) -> int:
+    """
+    Number of the last placement that touched a tile, 0 if none did.
+
+    Images are only ever added, so this changes exactly when the tile's
+    pixels do; it names cached tiles and makes their ETag.
+    """
+    left, top, width, height = info.region(z, x, y)
+    left, top = left + origin[0], top + origin[1]
+    version = 0
+    for number, p in enumerate(placements, 1):
+        if p.x < left + width and left < p.x + p.width and p.y < top + height and top < p.y + p.height:
+            version = number
+    return version
+
+
+# Mosaics opened by this worker process, reloaded when mosaic.json changes.
+_mosaics: Dict[str, Tuple[int, Mosaic]] = {}
+
+
+def _open_mosaic(directory: Path) -> Mosaic:
+    mtime = (directory / "mosaic.json").stat().st_mtime_ns
+    cached = _mosaics.get(str(directory))
+    if cached is None or cached[0] != mtime:
+        if cached is not None:
+            cached[1].close()
+        cached = (mtime, Mosaic(directory, readonly=True))
+        _mosaics[str(directory)] = cached
+    return cached[1]
+
+
+def _mosaic_tile(mosaic: Mosaic, cache_dir: Path, origin, info: PyramidInfo, z: int, x: int, y: int, quality: int):
+    if not info.contains(z, x, y):
+        return None
+    version = mosaic_tile_version(mosaic.placements, origin, info, z, x, y)
+    path = cache_dir / str(z) / f"{x}_{y}_v{version}.jpg"
+    if path.exists():
+        tile = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if tile is not None:
+            return tile
+    left, top, width, height = info.region(z, x, y)
+    if z == info.max_zoom:
+        tile = mosaic.read(origin[0] + left, origin[1] + top, width, height)
+    else:
+        # Compose the four children and halve them, so every level reads the
+        # canvas only once and low zooms reuse cached tiles.
+        size = info.tile_size
+        out = np.zeros((2 * size, 2 * size, 3), np.uint8)
+        for dy in (0, 1):
+            for dx in (0, 1):
+                child = _mosaic_tile(mosaic, cache_dir, origin, info, z + 1, 2 * x + dx, 2 * y + dy, quality)
+                if child is not None:
+                    out[dy * size : dy * size + child.shape[0], dx * size : dx * size + child.shape[1]] = child
+        level_width, level_height = info.level_size(z)
+        tile_width = min(size, level_width - x * size)
+        tile_height = min(size, level_height - y * size)
+        tile = cv2.resize(out, (size, size), interpolation=cv2.INTER_AREA)[:tile_height, :tile_width]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_jpeg(path, tile, quality)
+    for stale in path.parent.glob(f"{x}_{y}_v*.jpg"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return tile
+
+
+def render_mosaic_tile(
+    mosaic_dir, cache_dir, z: int, x: int, y: int, tile_size: int = TILE_SIZE, quality: int = TILE_QUALITY
+) -> Optional[str]:
+    """
+    Render one mosaic tile, and any missing tiles below it, into the cache.
+
+    Cached tiles are named after `mosaic_tile_version`, so a tile is redrawn
+    only after an image lands on it. Meant to run on a worker process; the
+    mosaic's memory-mapped tiles are opened read-only there.
+
+    Returns:
+        Optional[str]: Path of the cached tile, or None if it lies outside the mosaic.
+    """
+    mosaic = _open_mosaic(Path(mosaic_dir))
+    if mosaic.bounds is None:
+        return None
+    origin, info = mosaic_info(mosaic.bounds, tile_size)
+    root = Path(cache_dir)
+    cache_dir = root / mosaic_layout_key(origin, info)
+    if not cache_dir.exists() and root.exists():
+        # The mosaic grew past its layout; tiles of the old one are never served again.
+        for old in root.iterdir():
+            shutil.rmtree(old, ignore_errors=True)
+    if _mosaic_tile(mosaic, cache_dir, origin, info, z, x, y, quality) is None:
+        return None
+    version = mosaic_tile_version(mosaic.placements, origin, info, z, x, y)
+    return str(cache_dir / str(z) / f"{x}_{y}_v{version}.jpg")
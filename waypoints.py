@@ -0,0 +1,71 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class WaypointStore:
+    """
+    Last good focus and exposure per robot waypoint, persisted as JSON.
+
+    Entries are keyed by `tool_id` and `waypoint_index`, the same pair
+    `/capture` puts in filenames, and hold whatever the caller records: lens
+    position, exposure, auto exposure state, AMR and the sharpness measured
+    when they were saved. The whole file is read once at start-up, so lookups
+    never touch the disk; every `put` rewrites it atomically.
+
+    Parameters:
+        path (str | Path): JSON file; created on the first `put`.
+    """
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    @staticmethod
+    def key(tool_id, waypoint_index) -> str:
+        return f"{tool_id}/{waypoint_index}"
+
+    def get(self, tool_id, waypoint_index) -> Optional[Dict[str, Any]]:
+        """Return a copy of the stored entry, or None if the waypoint is new."""
+        with self._lock:
+            entry = self._entries.get(self.key(tool_id, waypoint_index))
+            return dict(entry) if entry is not None else None
+
+    def put(self, tool_id, waypoint_index, **values: Any) -> Dict[str, Any]:
+        """
+        Merge `values` into a waypoint's entry and write the store to disk.
+
+        Returns:
+            Dict[str, Any]: The updated entry, including an `updated` epoch time.
+        """
+        with self._lock:
+            entry = self._entries.setdefault(self.key(tool_id, waypoint_index), {})
+            entry.update(values, updated=time.time())
+            self._save()
+            return dict(entry)
+
+    def forget(self, tool_id, waypoint_index) -> bool:
+        """Drop a waypoint's entry; returns False if there was none."""
+        with self._lock:
+            if self._entries.pop(self.key(tool_id, waypoint_index), None) is None:
+                return False
+            self._save()
+            return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _save(self) -> None:
+        # Write a sibling file and swap it in, so a crash never leaves half a store.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)